@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+import time
+
+from benchmark.stub_server import StubServer
+from common.session import configure_session
+from shenzhen.craw_shenzhen_news import CrawShenZhenNews
+
+ROOT = 'http://www.sz.gov.cn/cn/xxgk/xwfyr/xwtg/'
+
+LISTING = '''<html><head><meta charset="utf-8"></head><body>
+<div class="zx_ml_list"><ul>%s</ul></div>
+<script>createPageHTML(%s, 0, "index","htm",%s);</script>
+</body></html>'''
+
+ITEM = '<li><span class="tit"><a href="./201907/t20190708_%s.htm">新闻发布稿%s</a></span></li>'
+
+DETAIL = '''<html><head><meta charset="utf-8"></head><body>
+<div class="TRS_Editor"><p>深圳市政府新闻发布第%s号</p><p>%s</p></div>
+</body></html>'''
+
+
+def build_site(page_num, items_per_page):
+    """
+    生成一个“新闻发布”栏目的桩站点
+    :param page_num: listing page number
+    :param items_per_page: news number of each listing page
+    :return: pages dict
+    """
+    pages = {}
+    total = page_num * items_per_page
+    for p in range(page_num):
+        items = []
+        for k in range(items_per_page):
+            num = p * items_per_page + k
+            items.append(ITEM % (num, num))
+            pages[ROOT + '201907/t20190708_%s.htm' % num] = DETAIL % (num, '正文内容。' * 200)
+        page_url = ROOT + ('index.htm' if p == 0 else 'index_%s.htm' % p)
+        pages[page_url] = LISTING % (''.join(items), page_num, total)
+    return pages
+
+
+def bench(name, func, requests_num):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print('%-12s %6.2fs  %8.1f pages/sec' % (name, elapsed, requests_num / elapsed))
+
+
+if __name__ == '__main__':
+    """
+    对比顺序爬取、asyncio 爬取与流水线爬取的 pages/sec，用法：python -m benchmark.bench_async [page_num] [items] [latency]
+    """
+    page_num = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    items_per_page = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+    news = CrawShenZhenNews()
+    with StubServer(build_site(page_num, items_per_page), latency=latency) as server:
+        configure_session(proxies={'http': server.url})
+        # 首页会被 get_total_page_num 多请求一次
+        requests_num = 1 + page_num * (items_per_page + 1)
+        for name, run in [('sequential', news.run), ('asyncio', news.run_async), ('pipeline', news.run_pipeline)]:
+            # run 在 save_dir 旁边写入 save_dir + '.csv' 与 '.metrics.json'，save_dir 放在临时目录的子目录中一并删除
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                save_dir = tmp_dir + '/news'
+                os.mkdir(save_dir)
+                bench(name, lambda: run(save_dir, ROOT + 'index.htm'), requests_num)
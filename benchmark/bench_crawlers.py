@@ -0,0 +1,222 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from multiprocessing import Pool
+
+from benchmark.mock_site import TARGETS, build_mock_site
+from benchmark.stub_server import StubServer
+from common.metrics import metrics
+from common.parallel import ParallelRunner
+from common.scheduler import WorkStealingScheduler
+from common.session import configure_session
+from common.shared_state import get_shared_state, set_shared_state
+from common.throttle import configure_throttle
+from common.writers import configure_writer, SUFFIXES
+from shenzhen import optimize_craw
+from shenzhen.craw_shenzhen_gov_bulletin import CrawShenZhenBulletin
+from shenzhen.craw_shenzhen_gov_files import CrawShenZhenGov
+from shenzhen.craw_shenzhen_gov_reports import CrawShenZhenReport
+from shenzhen.craw_shenzhen_gov_work import CrawShenZhenWork
+from shenzhen.craw_shenzhen_news import CrawShenZhenNews
+
+
+def craw_gov(save_dir):
+    CrawShenZhenGov().run(excel_name=None, sheet_name='政策解读', save_dir=save_dir, target_url=TARGETS['policy'])
+
+
+def craw_bulletin(save_dir):
+    CrawShenZhenBulletin().run(excel_name=None, sheet_name='政府公报', save_dir=save_dir,
+                               target_url=TARGETS['bulletin'])
+
+
+def craw_report(save_dir):
+    CrawShenZhenReport().run(excel_name=None, sheet_name='政府工作报告', save_dir=save_dir,
+                             target_url=TARGETS['report'])
+
+
+def craw_news(save_dir):
+    CrawShenZhenNews().run(save_dir=save_dir, target_url=TARGETS['news'])
+
+
+def craw_work(save_dir):
+    CrawShenZhenWork().run(save_dir=save_dir, target_url=TARGETS['work'])
+
+
+def init_worker(proxy, state=None):
+    configure_session(proxies={'http': proxy})
+    if state is not None:
+        set_shared_state(state)
+
+
+def metered(func, *args):
+    """
+    在子进程中运行 func(*args)，连同这次调用的指标一起返回，由主进程合并
+    :return: result of func, metrics snapshot
+    """
+    metrics.reset()
+    result = func(*args)
+    return result, metrics.snapshot()
+
+
+def metered_task(task):
+    """
+    WorkStealingScheduler 的任务函数
+    :param task: (func, args)
+    """
+    return metered(task[0], *task[1])
+
+
+def merged(results):
+    """
+    合并子进程返回的指标
+    :param results: list of (result, metrics snapshot)
+    :return: list of result
+    """
+    for result, snapshot in results:
+        metrics.merge(snapshot)
+    return [result for result, snapshot in results]
+
+
+def craw_optimize(save_dir, processes=4):
+    """
+    与 optimize_craw.py 的 __main__ 相同：每期公报一个任务
+    """
+    previous_urls, previous_titles = optimize_craw.get_previous_bulletin_urls(TARGETS['bulletin'])
+    pool = Pool(processes, initializer=init_worker, initargs=(os.environ['BENCH_PROXY'], get_shared_state()))
+    jobs = []
+    for p in range(len(previous_urls)):
+        previous_dir = save_dir + '/' + previous_titles[p]
+        if os.path.exists(previous_dir) is False:
+            os.mkdir(previous_dir)
+        jobs.append(pool.apply_async(metered, args=(optimize_craw.craw_job, previous_urls[p], previous_titles[p],
+                                                    previous_dir)))
+    pool.close()
+    pool.join()
+    merged([job.get() for job in jobs])
+
+
+def craw_work_stealing(save_dir, processes=4):
+    """
+    与 optimize_craw.py 的 __main__ 相同：各期拆分为通知，按工作窃取调度
+    """
+    previous_urls, previous_titles = optimize_craw.get_previous_bulletin_urls(TARGETS['bulletin'])
+    scheduler = WorkStealingScheduler(processes, initializer=init_worker, initargs=(os.environ['BENCH_PROXY'],))
+    issue_tasks = []
+    for p in range(len(previous_urls)):
+        previous_dir = save_dir + '/' + previous_titles[p]
+        if os.path.exists(previous_dir) is False:
+            os.mkdir(previous_dir)
+        issue_tasks.append((previous_urls[p], previous_titles[p], previous_dir, None, '政府公报'))
+    list_results = merged(scheduler.run(metered_task, [(optimize_craw.list_job, (task,)) for task in issue_tasks]))
+    notice_tasks = [task for tasks in list_results if tasks for task in tasks]
+    merged(scheduler.run(metered_task, [(optimize_craw.notice_job, (task,)) for task in notice_tasks]))
+    for stats in scheduler.utilization():
+        metrics.observe('worker_utilization', stats['utilization'])
+
+
+def craw_parallel(save_dir, processes=4):
+    ParallelRunner(CrawShenZhenBulletin, processes=processes).run(save_dir=save_dir, target_url=TARGETS['bulletin'])
+
+
+BENCHMARKS = {
+    'CrawShenZhenGov': craw_gov,
+    'CrawShenZhenBulletin': craw_bulletin,
+    'CrawShenZhenReport': craw_report,
+    'CrawShenZhenNews': craw_news,
+    'CrawShenZhenWork': craw_work,
+    'optimize_craw': craw_optimize,
+    'work_stealing': craw_work_stealing,
+    'ParallelRunner': craw_parallel,
+}
+
+
+def run_benchmark(name, proxy, result_queue, throttle=None, output_format='docx', archive=False):
+    """
+    在独立进程中运行一个爬虫，保证 peak RSS 互不影响
+    """
+    os.environ['BENCH_PROXY'] = proxy
+    # 屏蔽爬虫的逐条打印
+    sys.stdout = open(os.devnull, mode='w')
+    configure_session(proxies={'http': proxy})
+    configure_throttle(**(throttle or {}))
+    configure_writer(format=output_format)
+    metrics.reset()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        save_dir = tmp_dir + '/' + name
+        os.mkdir(save_dir)
+        if archive:
+            configure_writer(archive_dir=tmp_dir + '/archive')
+        start = time.perf_counter()
+        error = None
+        try:
+            BENCHMARKS[name](save_dir)
+        except Exception as e:
+            error = repr(e)
+        elapsed = time.perf_counter() - start
+    # linux 下 ru_maxrss 的单位是 KB；RUSAGE_CHILDREN 的 ru_maxrss 是峰值最大的单个子进程，不是各子进程之和
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    result_queue.put({'name': name, 'elapsed': elapsed, 'peak_rss_kb': peak_rss,
+                      'max_child_peak_rss_kb': child_peak_rss, 'error': error, 'stages': metrics.summary()['histograms']})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线爬虫基准测试：在本地模拟站点上运行各爬虫')
+    parser.add_argument('names', nargs='*', default=list(BENCHMARKS), help='benchmarks to run, default all')
+    parser.add_argument('--pages', type=int, default=5, help='listing pages of each section')
+    parser.add_argument('--items', type=int, default=20, help='notifications of each listing page or issue')
+    parser.add_argument('--issues', type=int, default=4, help='bulletin issues')
+    parser.add_argument('--attachment-size', type=int, default=64 * 1024, help='bytes of each attachment')
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds of server latency')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random seconds of server latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probability of 503 responses')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the server')
+    parser.add_argument('--rate', type=float, help='requests per second of each host, default unlimited')
+    parser.add_argument('--adaptive', action='store_true', help='enable AIMD adaptive concurrency')
+    parser.add_argument('--format', default='docx', choices=list(SUFFIXES), help='output format of notices')
+    parser.add_argument('--archive', action='store_true', help='append notices and attachments to tar shards')
+    parser.add_argument('--json', help='save results to json file')
+    args = parser.parse_args()
+
+    pages = build_mock_site(page_num=args.pages, items_per_page=args.items, issue_num=args.issues,
+                            attachment_size=args.attachment_size)
+    throttle = {'rate': args.rate, 'adaptive': args.adaptive}
+    results = []
+    with StubServer(pages, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                    seed=args.seed) as server:
+        print('%-22s %8s %8s %10s %10s %14s  %s' % ('benchmark', 'requests', 'seconds', 'pages/sec', 'peak RSS',
+                                                     'max child RSS', 'error'))
+        for name in args.names:
+            result_queue = multiprocessing.Queue()
+            requests_before = server.requests
+            process = multiprocessing.Process(target=run_benchmark,
+                                              args=(name, server.url, result_queue, throttle, args.format,
+                                                    args.archive))
+            process.start()
+            result = result_queue.get()
+            process.join()
+            result['requests'] = server.requests - requests_before
+            result['pages_per_sec'] = result['requests'] / result['elapsed']
+            results.append(result)
+            print('%-22s %8s %8.2f %10.1f %8.1fMB %12.1fMB  %s' % (
+                name, result['requests'], result['elapsed'], result['pages_per_sec'], result['peak_rss_kb'] / 1024,
+                result['max_child_peak_rss_kb'] / 1024, result['error'] or ''))
+            for stage, summary in sorted(result['stages'].items()):
+                print('    %-26s count %6s  mean %8.4fs  p95 %8.4fs' % (stage, summary['count'], summary['mean'],
+                                                                        summary['p95']))
+    if args.json:
+        with open(args.json, mode='w', encoding='utf-8') as fp:
+            json.dump(results, fp, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    """
+    用法：python -m benchmark.bench_crawlers [CrawShenZhenNews ...] --pages 5 --items 20 --latency 0.01
+    """
+    main()
@@ -0,0 +1,118 @@
+import argparse
+import time
+
+from lxml import etree
+
+from benchmark.mock_site import HOST, make_trs_detail, make_xxgk_detail
+from common.parser import encode_infos, parse_trs_page, parse_xxgk_page
+
+
+def legacy_parse_xxgk(url, page_content):
+    """
+    原来各爬虫中的解析方式：每个字段一次 xpath，每个段落一次 string(.)
+    """
+    html = etree.HTML(page_content)
+    index = html.xpath('//div[@class="xx_con"]/p[1]/text()')
+    aspect = html.xpath('//div[@class="xx_con"]/p[2]/text()')
+    announced_by = html.xpath('//div[@class="xx_con"]/p[3]/text()')
+    announced_date = html.xpath('//div[@class="xx_con"]/p[4]/text()')
+    title = html.xpath('//div[@class="xx_con"]/p[5]/text()')
+    document_num = html.xpath('//div[@class="xx_con"]/p[6]/text()')
+    key_word = html.xpath('//div[@class="xx_con"]/p[7]/text()')
+    base_infos = [index, ['广东省'], ['深圳市'], aspect, document_num, announced_by, announced_date, title, key_word]
+    base_infos = list(map(lambda x: x[0].encode('utf-8') if len(x) > 0 else ' ', base_infos))
+    paragraphs = html.xpath('//div[@class="news_cont_d_wrap"]//p')
+    contents = []
+    for paragraph in paragraphs:
+        contents.append(paragraph.xpath('string(.)').strip())
+    contents = '\n'.join(contents)
+    attachments = []
+    script_str = html.xpath('//div[@class="fjdown"]/script/text()')[0]
+    if script_str.find('var linkdesc="";') == -1:
+        attach_names = script_str.split('var linkdesc="')[-1].split('";')[0].split(';')
+        attach_urls = script_str.split('var linkurl="')[-1].split('";')[0].split(';')
+        suffix = url.split('/')[-1]
+        for k in range(len(attach_urls)):
+            attach_url = url.replace(suffix, attach_urls[k].split('./')[-1])
+            attach_name = attach_names[k].replace('/', '-').replace('<', '(').replace('>', ')')
+            attachments.append([attach_name, attach_url])
+    return base_infos, contents, attachments
+
+
+def single_pass_xxgk(url, page_content):
+    fields, contents, attachments = parse_xxgk_page(url, page_content)
+    index, aspect, announced_by, announced_date, title, document_num, key_word = fields
+    base_infos = encode_infos([index, '广东省', '深圳市', aspect, document_num, announced_by, announced_date,
+                               title, key_word])
+    return base_infos, contents, attachments
+
+
+def legacy_parse_trs(url, page_content):
+    html = etree.HTML(page_content)
+    paragraphs = html.xpath('//div[@class="TRS_Editor"]//p')
+    return '\n'.join(paragraph.xpath('string(.)').strip() for paragraph in paragraphs)
+
+
+def single_pass_trs(url, page_content):
+    return parse_trs_page(page_content)
+
+
+def build_corpus(page_num, attachment_num):
+    """
+    用 fixtures 生成通知页语料
+    :return: (xxgk pages, trs pages), each is a list of (url, html text)
+    """
+    pages = {}
+    xxgk_urls = []
+    trs_urls = []
+    for num in range(page_num):
+        url = HOST + '/cn/xxgk/zfxxgj/zcjd/201907/t20190708_%s.htm' % num
+        make_xxgk_detail(url, num, '政策第%s号' % num, attachment_num, 16, pages)
+        xxgk_urls.append(url)
+        url = HOST + '/cn/xxgk/xwfyr/xwtg/201907/t20190708_%s.htm' % num
+        make_trs_detail(url, num, '新闻第%s号' % num, pages)
+        trs_urls.append(url)
+    return [(url, pages[url]) for url in xxgk_urls], [(url, pages[url]) for url in trs_urls]
+
+
+def measure(func, corpus, repeat):
+    """
+    :return: best microseconds per page of repeat runs
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for url, page_content in corpus:
+            func(url, page_content)
+        elapsed = (time.perf_counter() - start) / len(corpus) * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='通知页解析的微基准：逐字段 xpath 与单次遍历解析对比')
+    parser.add_argument('--pages', type=int, default=200, help='pages of each format')
+    parser.add_argument('--attachments', type=int, default=3, help='attachments of each xxgk page')
+    parser.add_argument('--repeat', type=int, default=5, help='repeat times, the best one is reported')
+    args = parser.parse_args()
+
+    xxgk_corpus, trs_corpus = build_corpus(args.pages, args.attachments)
+    # 两种解析的结果必须一致
+    for url, page_content in xxgk_corpus:
+        assert legacy_parse_xxgk(url, page_content) == single_pass_xxgk(url, page_content), url
+    for url, page_content in trs_corpus:
+        assert legacy_parse_trs(url, page_content) == single_pass_trs(url, page_content), url
+
+    print('%-8s %14s %14s %8s' % ('format', 'legacy us/page', 'single us/page', 'speedup'))
+    for name, corpus, legacy, single in (('xxgk', xxgk_corpus, legacy_parse_xxgk, single_pass_xxgk),
+                                         ('trs', trs_corpus, legacy_parse_trs, single_pass_trs)):
+        before = measure(legacy, corpus, args.repeat)
+        after = measure(single, corpus, args.repeat)
+        print('%-8s %14.1f %14.1f %7.2fx' % (name, before, after, before / after))
+
+
+if __name__ == '__main__':
+    """
+    用法：python -m benchmark.bench_parser --pages 200 --attachments 3
+    """
+    main()
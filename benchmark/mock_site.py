@@ -0,0 +1,139 @@
+import os
+
+from string import Template
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+HOST = 'http://www.sz.gov.cn'
+
+# 各栏目的入口 url，与 shenzhen 下各爬虫 __main__ 中的 target_urls 一致
+TARGETS = {
+    'policy': HOST + '/cn/xxgk/zfxxgj/zcjd/index_wzjd_42052.htm',
+    'public': HOST + '/zfwj/zfwjnew/szfwj_139223/index.htm',
+    'news': HOST + '/cn/xxgk/xwfyr/xwtg/index.htm',
+    'work': HOST + '/cn/xxgk/zfxxgj/zwdt/index.htm',
+    'bulletin': HOST + '/zfgb/2019/gb1099_181240/',
+    'report': HOST + '/cn/xxgk/zfxxgj/gzbg/gwyzf',
+}
+
+
+def load_fixture(name):
+    """
+    load a recorded page template from fixtures
+    :param name: fixture filename, like 'detail_xxgk.htm'
+    :return: string.Template
+    """
+    with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as fp:
+        return Template(fp.read())
+
+
+def make_paragraphs(num, paragraph_num):
+    return '\n'.join('<p>第%s条　这是第%s号通知的正文内容，用于测试解析性能。%s</p>' % (k + 1, num, '深圳市' * 20)
+                     for k in range(paragraph_num))
+
+
+def make_xxgk_detail(url, num, title, attachment_num, attachment_size, pages, year=2019):
+    """
+    生成“信息公开”格式的通知页（xx_con、news_cont_d_wrap、fjdown），附件一并加入 pages
+    """
+    names = []
+    links = []
+    for k in range(attachment_num):
+        name = 'P0%s_%s_%s.pdf' % (num, k, k)
+        names.append('附件%s：%s的附表' % (k + 1, title))
+        links.append('./' + name)
+        pages[url.rsplit('/', 1)[0] + '/' + name] = b'%PDF-1.4\n' + os.urandom(attachment_size)
+    pages[url] = load_fixture('detail_xxgk.htm').substitute(
+        title=title, num=num, year=year, paragraphs=make_paragraphs(num, 30),
+        linkdesc=';'.join(names), linkurl=';'.join(links))
+
+
+def make_trs_detail(url, num, title, pages):
+    """
+    生成新闻格式的通知页（TRS_Editor）
+    """
+    pages[url] = load_fixture('detail_trs.htm').substitute(title=title, paragraphs=make_paragraphs(num, 30))
+
+
+def make_listing(pages, section, page_num, items_per_page, attachment_num, attachment_size):
+    """
+    生成一个分页的栏目（createPageHTML）及其所有通知页
+    """
+    target = TARGETS[section]
+    base = target.rsplit('/', 1)[0]
+    item = load_fixture('item_%s.htm' % section)
+    total = page_num * items_per_page
+    for p in range(page_num):
+        items = []
+        for k in range(items_per_page):
+            num = p * items_per_page + k
+            # 最新在前：编号越小日期越新
+            date = '201907%02d' % (28 - num % 28)
+            values = {'month': date[:6], 'date': date, 'num': num, 'day': '%s-%s-%s' % (date[:4], date[4:6], date[6:])}
+            items.append(item.substitute(values))
+            if section == 'public':
+                url = HOST + '/zfwj/zfwjnew/szfwj_139223/%s/t%s_%s.htm' % (date[:6], date, num)
+            else:
+                url = base + '/%s/t%s_%s.htm' % (date[:6], date, num)
+            title = '%s第%s号' % (section, num)
+            if section in ('policy', 'public'):
+                make_xxgk_detail(url, num, title, attachment_num, attachment_size, pages)
+            else:
+                make_trs_detail(url, num, title, pages)
+        page_url = target if p == 0 else target.replace('.htm', '_%s.htm' % p)
+        pages[page_url] = load_fixture('list_%s.htm' % section).substitute(
+            items='\n'.join(items), page_num=page_num, page_index=p, total=total)
+
+
+def make_bulletin(pages, issue_num, items_per_page, attachment_num, attachment_size):
+    """
+    生成政府公报的往期目录（select3 与 opath.push）及其所有通知页
+    """
+    target = TARGETS['bulletin']
+    issues = [(target, './gb1099_181240/')] + [
+        (target.split('2019')[0] + '2019/gb%s_18%s/' % (1099 - k, 1240 - k), './gb%s_18%s/' % (1099 - k, 1240 - k))
+        for k in range(1, issue_num)]
+    options = '\n'.join('<option value="%s">2019年第%s期</option>' % (issues[k][1], issue_num - k)
+                        for k in range(issue_num))
+    for k in range(issue_num):
+        issue_url = issues[k][0]
+        pushes = []
+        for i in range(items_per_page):
+            num = k * items_per_page + i
+            pushes.append('opath.push("./content/post_%s.html");' % num)
+            make_xxgk_detail(issue_url + 'content/post_%s.html' % num, num, '公报第%s号' % num,
+                             attachment_num, attachment_size, pages)
+        pages[issue_url] = load_fixture('bulletin_issue.htm').substitute(options=options, pushes='\n'.join(pushes))
+
+
+def make_reports(pages, report_num, attachment_num, attachment_size):
+    """
+    生成政府工作报告的年份列表及各年报告页
+    """
+    target = TARGETS['report']
+    items = []
+    for k in range(report_num):
+        url = target + '/201%s/t201%s0101_%s.htm' % (k, k, k)
+        items.append('<li><a href="%s">201%s年政府工作报告</a></li>' % (url, k))
+        make_xxgk_detail(url, k, '政府工作报告', attachment_num, attachment_size, pages, year=2010 + k)
+    pages[target] = load_fixture('report_index.htm').substitute(items='\n'.join(items))
+
+
+def build_mock_site(page_num=5, items_per_page=20, issue_num=4, report_num=5, attachment_num=1,
+                    attachment_size=64 * 1024):
+    """
+    生成覆盖所有栏目的模拟站点，配合 StubServer 使用
+    :param page_num: listing page number of each paginated section
+    :param items_per_page: notification number of each listing page or bulletin issue
+    :param issue_num: bulletin issue number
+    :param report_num: work report number
+    :param attachment_num: attachments of each xxgk notification
+    :param attachment_size: bytes of each attachment
+    :return: pages dict
+    """
+    pages = {}
+    for section in ('policy', 'public', 'news', 'work'):
+        make_listing(pages, section, page_num, items_per_page, attachment_num, attachment_size)
+    make_bulletin(pages, issue_num, items_per_page, attachment_num, attachment_size)
+    make_reports(pages, report_num, attachment_num, attachment_size)
+    return pages
@@ -0,0 +1,112 @@
+import mimetypes
+import random
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer:
+    """
+    本地桩 HTTP 服务器，按完整 url 返回预置的页面，可模拟延迟与错误率。
+    通过 configure_session(proxies={'http': server.url}) 把爬虫的请求代理到这里，爬虫代码无需修改
+    """
+
+    def __init__(self, pages, latency=0.0, jitter=0.0, error_rate=0.0, seed=None, port=0):
+        """
+        :param pages: dict, like {'http://www.sz.gov.cn/index.htm': '<html>...</html>'}, values are str or bytes,
+            or an int status answered with an empty body, like 503
+        :param latency: seconds to sleep before each response
+        :param jitter: extra random seconds in [0, jitter] added to latency
+        :param error_rate: probability of answering 503 instead of the page
+        :param seed: random seed of jitter and errors
+        :param port: listening port, 0 means a free port
+        """
+        self.pages = pages
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self.make_handler())
+        self.server.daemon_threads = True
+        # 客户端提前断开（如超过 max_size）属于正常情况，不打印异常
+        self.server.handle_error = lambda request, client_address: None
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%s' % self.server.server_address[1]
+
+    def make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def send_empty(self, status):
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    delay = stub.latency + stub.random.uniform(0, stub.jitter)
+                    failed = stub.random.random() < stub.error_rate
+                    if failed:
+                        stub.errors += 1
+                # 代理请求的 path 是完整 url，直连请求需拼上 Host
+                url = self.path if self.path.startswith('http') else 'http://' + self.headers['Host'] + self.path
+                if delay:
+                    time.sleep(delay)
+                if failed:
+                    return self.send_empty(503)
+                body = stub.pages.get(url)
+                if body is None:
+                    return self.send_empty(404)
+                if isinstance(body, int):
+                    return self.send_empty(body)
+                if isinstance(body, str):
+                    body = body.encode('utf-8')
+                content_type = mimetypes.guess_type(url.split('?')[0])[0] or 'text/html'
+                if content_type.startswith('text/'):
+                    content_type += '; charset=utf-8'
+                # 支持 'bytes=N-' 形式的断点续传
+                match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+                if match and int(match.group(1)) >= len(body):
+                    return self.send_empty(416)
+                if match:
+                    start = int(match.group(1))
+                    self.send_response(206)
+                    self.send_header('Content-Range', 'bytes %s-%s/%s' % (start, len(body) - 1, len(body)))
+                    body = body[start:]
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
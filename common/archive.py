@@ -0,0 +1,179 @@
+import io
+import mmap
+import os
+import tarfile
+import threading
+import time
+
+from common.metrics import metrics
+from common.sqlite_conn import ProcessConnection
+
+
+class ArchiveStore:
+    """
+    把正文与附件追加写入固定大小的 tar 分片，代替每条通知一个文件、每组附件一个目录。
+    每个文件在 sqlite 索引中记录所在分片与数据的偏移量，读取单个文件时 mmap 对应分片后直接切片；
+    分片是标准的 tar 文件，也可以用 tar 命令解压。每个进程写自己的分片，多进程写入无需加锁
+    """
+
+    def __init__(self, root, shard_size=256 * 1024 * 1024):
+        """
+        :param root: archive directory, like 'data/archive'
+        :param shard_size: start a new shard when the current one exceeds this many bytes
+        """
+        self.root = root
+        self.shard_size = shard_size
+        if os.path.exists(root) is False:
+            os.makedirs(root)
+        self._lock = threading.Lock()
+        self._tar = None
+        self._shard = None
+        self._maps = {}
+        # fork 出的子进程不能沿用父进程的 sqlite 连接与正在写入的分片
+        self._db = ProcessConnection(os.path.join(root, 'index.db'), on_fork=self._reset)
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                     'name TEXT PRIMARY KEY, shard TEXT, offset INTEGER, size INTEGER, updated REAL)')
+        conn.commit()
+
+    def _connect(self):
+        return self._db.get()
+
+    def _reset(self):
+        self._tar = None
+        self._maps = {}
+
+    def _writer(self):
+        """
+        get the tar of current shard, a new shard is started when it is full
+        """
+        if self._tar is not None and self._tar.offset >= self.shard_size:
+            self._tar.close()
+            self._tar = None
+        if self._tar is None:
+            seq = 0
+            while True:
+                self._shard = 'shard-%s-%s-%05d.tar' % (time.strftime('%Y%m%d%H%M%S'), os.getpid(), seq)
+                if os.path.exists(os.path.join(self.root, self._shard)) is False:
+                    break
+                seq += 1
+            self._tar = tarfile.open(os.path.join(self.root, self._shard), mode='w', format=tarfile.PAX_FORMAT)
+        return self._tar
+
+    @metrics.timed('archive_add')
+    def add(self, name, fileobj, size):
+        """
+        append a file to the current shard and index it
+        :param name: path of the file as if it were saved on disk, like 'data/政策解读/标题.docx'
+        :param fileobj: readable binary file object
+        :param size: bytes of fileobj
+        :return: None
+        """
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = time.time()
+        with self._lock:
+            conn = self._connect()
+            tar = self._writer()
+            tar.addfile(info, fileobj)
+            # 数据在头部之后，按 512 字节对齐填充，tar.offset 指向填充之后
+            offset = tar.offset - (size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+            tar.fileobj.flush()
+            conn.execute('INSERT OR REPLACE INTO entries (name, shard, offset, size, updated) VALUES (?, ?, ?, ?, ?)',
+                         (name, self._shard, offset, size, info.mtime))
+            conn.commit()
+
+    def add_bytes(self, name, data):
+        """
+        :param name: path of the file, like 'data/政策解读/标题.docx'
+        :param data: bytes
+        :return: None
+        """
+        self.add(name, io.BytesIO(data), len(data))
+
+    def add_file(self, name, filename):
+        """
+        :param name: path in the archive, like 'data/政策解读/标题/附件.pdf'
+        :param filename: local file to append
+        :return: None
+        """
+        with open(filename, mode='rb') as fp:
+            self.add(name, fp, os.path.getsize(filename))
+
+    def temp_path(self, name):
+        """
+        get a temporary local path for downloading a file before it is appended, removed by the caller
+        :param name: path in the archive
+        :return: path under root/tmp
+        """
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        return os.path.join(tmp_dir, '%s-%s-%s' % (os.getpid(), threading.get_ident(), abs(hash(name))))
+
+    def __contains__(self, name):
+        with self._lock:
+            return self._connect().execute('SELECT 1 FROM entries WHERE name = ?', (name,)).fetchone() is not None
+
+    def names(self, prefix=''):
+        """
+        :param prefix: like 'data/政府公报/'
+        :return: sorted names in the archive
+        """
+        with self._lock:
+            rows = self._connect().execute('SELECT name FROM entries WHERE name >= ? AND name < ? ORDER BY name',
+                                           (prefix, prefix + '\uffff')).fetchall()
+        return [row[0] for row in rows]
+
+    def get(self, name):
+        """
+        read a file by the offset index, the shard is mmapped once and reused
+        :param name: path in the archive
+        :return: bytes, or None if name is not in the archive
+        """
+        with self._lock:
+            row = self._connect().execute('SELECT shard, offset, size FROM entries WHERE name = ?',
+                                          (name,)).fetchone()
+            if row is None:
+                return None
+            shard, offset, size = row
+            if self._tar is not None and shard == self._shard:
+                self._tar.fileobj.flush()
+            # 正在写入的分片会变大，需要重新映射
+            if shard not in self._maps or len(self._maps[shard]) < offset + size:
+                with open(os.path.join(self.root, shard), mode='rb') as fp:
+                    self._maps[shard] = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._maps[shard][offset:offset + size]
+
+    def extract(self, name, filename):
+        """
+        save a file of the archive to local disk
+        :param name: path in the archive
+        :param filename: local filename
+        :return: bool value, False if name is not in the archive
+        """
+        data = self.get(name)
+        if data is None:
+            return False
+        with open(filename, mode='wb') as fp:
+            fp.write(data)
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        close the shard written by this process and the index connection, a later add starts a new shard
+        :return: None
+        """
+        with self._lock:
+            if self._db.owned() and self._tar is not None:
+                self._tar.close()
+            self._db.close()
+            for shard_map in self._maps.values():
+                shard_map.close()
+            self._tar = None
+            self._maps = {}
@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+class AsyncCrawler:
+    """
+    asyncio 爬取引擎：阻塞的抓取函数（如 get_info_urls_of_*、get_notification_infos）在线程池中运行，
+    每个 host 的并发数由信号量限制
+    """
+
+    def __init__(self, max_per_host=8, max_workers=32):
+        """
+        :param max_per_host: max concurrent requests of each host
+        :param max_workers: max threads of the executor
+        """
+        self.max_per_host = max_per_host
+        self.max_workers = max_workers
+        self.semaphores = {}
+        self.executor = None
+
+    def get_semaphore(self, url):
+        """
+        get the semaphore of url's host
+        :param url: target url
+        :return: asyncio.Semaphore
+        """
+        host = urlsplit(url).netloc
+        if host not in self.semaphores:
+            self.semaphores[host] = asyncio.Semaphore(self.max_per_host)
+        return self.semaphores[host]
+
+    async def call(self, func, url, *args):
+        """
+        run func(*args, url) in executor, bounded by the host semaphore
+        :param func: blocking function whose last argument is url
+        :param url: target url
+        :param args: arguments before url
+        :return: func result, or None if func raises
+        """
+        loop = asyncio.get_running_loop()
+        async with self.get_semaphore(url):
+            try:
+                return await loop.run_in_executor(self.executor, func, *args, url)
+            except Exception as e:
+                print('Craw Error:', url, repr(e))
+                return None
+
+    async def map(self, func, urls, *args):
+        """
+        run func on all urls concurrently
+        :param func: blocking function whose last argument is url
+        :param urls: url list
+        :param args: arguments before url
+        :return: results list, in the same order as urls
+        """
+        return await asyncio.gather(*[self.call(func, url, *args) for url in urls])
+
+    def run(self, coroutine):
+        """
+        run the coroutine in a new event loop
+        :param coroutine: main coroutine
+        :return: coroutine result
+        """
+        self.semaphores = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            self.executor = executor
+            try:
+                return asyncio.run(coroutine)
+            finally:
+                self.executor = None
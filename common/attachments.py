@@ -0,0 +1,159 @@
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from common.metrics import metrics
+from common.retry import get_dead_letters
+
+# 默认的附件下载队列配置，可通过 configure_attachments 修改
+_config = {
+    'workers': 0,  # 下载线程数，0 表示在写入通知时同步下载
+    'max_per_host': 4,  # 每个 host 同时下载的附件数
+}
+
+# 保护各进程第一次提交时创建线程池；fork 时可能正被其他线程持有，子进程中重新创建
+_reset_lock = threading.Lock()
+
+
+def _after_fork():
+    global _reset_lock
+    _reset_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class AttachmentQueue:
+    """
+    附件下载队列：通知写入后立即返回，附件在独立的线程池中下载，每个 host 的并发数有上限。
+    记录未完成的数量，join() 等待所有附件下载完成或记录为失败（见 common.retry.DeadLetters）
+    """
+
+    def __init__(self, workers=8, max_per_host=4):
+        """
+        :param workers: download threads
+        :param max_per_host: concurrent downloads of each host
+        """
+        self.workers = workers
+        self.max_per_host = max_per_host
+        self._pid = None
+        self._executor = None
+
+    def _reset(self):
+        # 线程不会随 fork 复制到子进程，每个进程在第一次提交时创建自己的线程池。
+        # 多个线程同时第一次提交时只创建一次，否则后创建的会清零其他线程已计入的 pending 与 stats
+        if self._pid == os.getpid():
+            return
+        with _reset_lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.workers)
+                self._hosts = {}
+                self._hosts_lock = threading.Lock()
+                self._done = threading.Condition()
+                self.pending = 0
+                self.stats = {'downloaded': 0, 'skipped': 0, 'failed': 0}
+                # 其他线程看到 _pid 后直接使用，需在其余状态都创建之后设置
+                self._pid = os.getpid()
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.Semaphore(self.max_per_host)
+            return self._hosts[host]
+
+    def submit(self, func, file_url, callback=None):
+        """
+        enqueue a download
+        :param func: function() -> True, False or None, like lambda: download_file(file_url, filename)
+        :param file_url: attachment url, for per-host limits and failure records
+        :param callback: function(ok) called in the download thread after func finished, ok is the result of func,
+            None if func raises
+        :return: None
+        """
+        self._reset()
+        with self._done:
+            self.pending += 1
+        self._executor.submit(self._run, func, file_url, callback)
+
+    def _run(self, func, file_url, callback):
+        ok = None
+        try:
+            with self._host_slot(file_url):
+                ok = func()
+        except Exception as e:  # download_file 已处理网络错误，这里只记录意外的异常
+            print('Download Error:', file_url, repr(e))
+            get_dead_letters().add('download', file_url, repr(e))
+        finally:
+            state = 'downloaded' if ok else 'failed' if ok is None else 'skipped'
+            with self._done:
+                self.stats[state] += 1
+            metrics.inc('attachments_' + state)
+            try:
+                if callback is not None:
+                    callback(ok)
+            finally:
+                with self._done:
+                    self.pending -= 1
+                    self._done.notify_all()
+
+    def join(self):
+        """
+        block until every submitted attachment of this process is done or failed
+        :return: None
+        """
+        if self._pid != os.getpid():
+            return
+        with self._done:
+            while self.pending > 0:
+                self._done.wait()
+
+    def report(self):
+        """
+        print downloaded, skipped and failed attachments of this process
+        :return: stats dict
+        """
+        self._reset()
+        print('Attachments: %s downloaded, %s skipped, %s failed' % (self.stats['downloaded'], self.stats['skipped'],
+                                                                      self.stats['failed']))
+        return dict(self.stats)
+
+
+_queue = None
+
+
+def configure_attachments(**kwargs):
+    """
+    configure the attachment download queue, call it before creating worker processes
+    :param kwargs: workers or max_per_host
+        eg. configure_attachments(workers=8, max_per_host=4)
+    :return: None
+    """
+    global _queue
+    for key in kwargs:
+        if key not in _config:
+            raise KeyError('Unknown attachment option: %s' % key)
+    _config.update(kwargs)
+    if _queue is not None:
+        wait_attachments()
+    _queue = AttachmentQueue(_config['workers'], _config['max_per_host']) if _config['workers'] > 0 else None
+
+
+def get_attachment_queue():
+    """
+    get the attachment download queue, None if attachments are downloaded synchronously
+    :return: AttachmentQueue or None
+    """
+    return _queue
+
+
+def wait_attachments():
+    """
+    wait for all queued attachments of this process, no-op if attachments are downloaded synchronously
+    :return: None
+    """
+    if _queue is not None:
+        _queue.join()
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import shutil
+import threading
+
+from common.sqlite_conn import ProcessConnection
+
+
+class BlobStore:
+    """
+    按内容 sha256 存放附件的仓库，并记录 url -> sha256 的索引。
+    同一个附件只下载一次，各通知目录中的文件是指向仓库的硬链接（不支持时复制）
+    """
+
+    def __init__(self, root):
+        """
+        :param root: store directory, like 'data/blobs'
+        """
+        self.root = root
+        if os.path.exists(root) is False:
+            os.makedirs(root)
+        self._lock = threading.Lock()
+        self._db = ProcessConnection(os.path.join(root, 'index.db'))
+        conn = self._db.get()
+        conn.execute('CREATE TABLE IF NOT EXISTS blob_index (url TEXT PRIMARY KEY, sha256 TEXT, size INTEGER)')
+        conn.commit()
+
+    def blob_path(self, sha256):
+        """
+        get the path of blob, like 'data/blobs/ab/abcdef...'
+        :param sha256: hex digest
+        :return: path
+        """
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def lookup(self, url):
+        """
+        get the sha256 of an already stored url
+        :param url: file url
+        :return: sha256, or None if url is not stored
+        """
+        with self._lock:
+            row = self._db.get().execute('SELECT sha256 FROM blob_index WHERE url = ?', (url,)).fetchone()
+        if row and os.path.exists(self.blob_path(row[0])):
+            return row[0]
+        return None
+
+    def link(self, url, filename):
+        """
+        link the stored blob of url to filename
+        :param url: file url
+        :param filename: target filename
+        :return: bool value, False if url is not stored
+        """
+        sha256 = self.lookup(url)
+        if sha256 is None:
+            return False
+        if os.path.exists(filename):
+            os.remove(filename)
+        try:
+            os.link(self.blob_path(sha256), filename)
+        except OSError:  # 跨磁盘或文件系统不支持硬链接
+            shutil.copyfile(self.blob_path(sha256), filename)
+        return True
+
+    def add(self, url, filename):
+        """
+        move a downloaded file into store, then link it back to filename
+        :param url: file url
+        :param filename: downloaded filename
+        :return: sha256
+        """
+        sha = hashlib.sha256()
+        size = 0
+        with open(filename, mode='rb') as fp:
+            for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+                sha.update(chunk)
+                size += len(chunk)
+        sha256 = sha.hexdigest()
+        blob_path = self.blob_path(sha256)
+        if os.path.exists(blob_path):
+            # 内容相同的附件已存在，删除新下载的副本
+            os.remove(filename)
+        else:
+            if os.path.exists(os.path.dirname(blob_path)) is False:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            shutil.move(filename, blob_path)
+        with self._lock:
+            conn = self._db.get()
+            conn.execute('INSERT OR REPLACE INTO blob_index (url, sha256, size) VALUES (?, ?, ?)', (url, sha256, size))
+            conn.commit()
+        self.link(url, filename)
+        return sha256
+
+    def close(self):
+        self._db.close()
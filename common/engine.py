@@ -0,0 +1,545 @@
+import asyncio
+import os
+import re
+import threading
+
+from urllib.parse import urljoin
+
+from common.async_craw import AsyncCrawler
+from common.attachments import wait_attachments
+from common.frontier import FETCHED, PARSED, WRITTEN
+from common.metrics import metrics
+from common.parser import encode_infos, parse_html, parse_trs_page, parse_xxgk_page
+from common.pipeline import CrawPipeline
+from common.search_index import flush_search_index, get_search_index
+from common.seen_index import get_seen_index
+from common.sink import MetadataSink
+from common.tools import get_html_bytes, get_changed_html_text, filter_new_urls, get_total_page_num, \
+    write_excel_file
+from common.writers import flush_archive, get_archive, get_suffix, save_attachment, write_document
+
+
+def clean_title(title):
+    """
+    去掉标题中不能用于文件名的字符
+    :param title: title str
+    :return: str
+    """
+    return title.replace('/', '-').replace('\\', '-').replace(' ', '') \
+        .replace('<', '(').replace('>', ')').replace('"', '-')
+
+
+class ProfileCrawler:
+    """
+    由 common.profile.SiteProfile 驱动的通用爬虫，所有栏目共用同一套抓取、解析、写入流程，
+    以及增量、异步、流水线、断点续爬与多进程（common.parallel.ParallelRunner）等运行方式。
+    列表页表示为 (分组标题, 保存目录, 列表页 url)，通知表示为 (分组标题, 保存目录, 通知 url, 列表页标题)
+    """
+    profile = None
+
+    def __init__(self, profile=None):
+        """
+        :param profile: SiteProfile, default is the class attribute profile
+        """
+        self.profile = profile or self.profile
+        # Excel 与 csv 中的列名
+        self.columns = [column for column, source in self.profile.columns]
+
+    def get_all_pages_urls(self, url, page_num):
+        """
+        根据 page number，拼接出所有页数的 url
+        :param url: target url
+        :param page_num: page number
+        :return: page_urls list
+        """
+        urls = [url]  # add first page url
+        url_pre = url.replace('.htm', '')
+        for i in range(1, page_num):
+            urls.append(self.profile.page_url % (url_pre, i))
+        return urls
+
+    def get_groups(self, url):
+        """
+        获取所有分组（如往期公报）的 url 与标题
+        :param url: target url
+        :return: group_urls list, group_titles list
+        """
+        html = parse_html(*get_html_bytes(url))
+        options = html.xpath(self.profile.group_xpath)
+        titles = [option.xpath('string(.)').strip() for option in options]
+        group_url = self.profile.group_url or (lambda target_url, link, title: urljoin(target_url, link))
+        urls = [url] + [group_url(url, options[k].get('value'), titles[k]) for k in range(1, len(options))]
+        return urls, titles
+
+    def list_pages(self, save_dir, target_url):
+        """
+        列出所有列表页，分组的子目录在这里创建
+        :param save_dir: 保存文本的目录
+        :param target_url: 要爬取的home url
+        :return: list of (group_title, page_dir, page_url)
+        """
+        if self.profile.group_xpath:
+            pages = []
+            group_urls, group_titles = self.get_groups(target_url)
+            for k in range(len(group_urls)):
+                group_dir = save_dir + '/' + group_titles[k]
+                # 多进程爬取时其他进程可能已创建该目录
+                os.makedirs(group_dir, exist_ok=True)
+                pages.append((group_titles[k], group_dir, group_urls[k]))
+            return pages
+        if self.profile.pagination:
+            prefix, suffix, delimiter = self.profile.pagination
+            num = get_total_page_num(target_url, prefix, suffix, delimiter)
+            return [(None, save_dir, page_url) for page_url in self.get_all_pages_urls(target_url, num)]
+        return [(None, save_dir, target_url)]
+
+    def resolve_link(self, page_url, link):
+        """
+        把列表页上的相对链接转为完整 url
+        """
+        if self.profile.link_prefix and 'http' not in link:
+            return self.profile.link_prefix + link.split('..')[-1]
+        return urljoin(page_url, link)
+
+    def get_info_urls(self, page_url):
+        """
+        爬取列表页上通知的链接与标题
+        :param page_url: listing page url
+        :return: info_urls list, titles list (None if the profile has no title_xpath)
+        """
+        page_content, encoding = get_html_bytes(page_url)
+        if not page_content:
+            return [], []
+        html = parse_html(page_content, encoding)
+        links = html.xpath(self.profile.link_xpath)
+        if self.profile.link_regex:
+            links = [link for text in links for link in re.findall(self.profile.link_regex, text)]
+        urls = [self.resolve_link(page_url, link) for link in links]
+        titles = html.xpath(self.profile.title_xpath) if self.profile.title_xpath else [None] * len(urls)
+        return urls, titles
+
+    def list_tasks(self, page):
+        """
+        列出一个列表页上的所有通知
+        :param page: (group_title, page_dir, page_url)
+        :return: list of (group_title, page_dir, info_url, title)
+        """
+        group_title, page_dir, page_url = page
+        info_urls, titles = self.get_info_urls(page_url)
+        return [(group_title, page_dir, info_urls[k], titles[k]) for k in range(len(info_urls)) if '' != info_urls[k]]
+
+    def iter_tasks(self, save_dir, target_url, seen=None, since_date=None, since_url=None):
+        """
+        逐页爬取列表页，按需产出通知
+        :param save_dir: 保存文本的目录
+        :param target_url: 要爬取的home url
+        :param seen: 已爬取过的 url 集合（如 set 或 FingerprintStore），跳过其中的通知
+        :param since_date: 只爬取该日期及之后发布的通知，如 '2019-07-08'
+        :param since_url: 上次爬取到的最新通知 url，列表按时间倒序，遇到它或某一页没有新通知时停止翻页
+        :return: generator of tasks
+        """
+        for page in self.list_pages(save_dir, target_url):
+            tasks = self.list_tasks(page)
+            indexes, stop = filter_new_urls([task[2] for task in tasks], seen, since_date, since_url)
+            for k in indexes:
+                yield tasks[k]
+            # 列表按时间倒序，整页都已爬取过则不再往后翻页
+            if stop:
+                print('Stop at', page[2])
+                break
+
+    def get_notification_infos(self, task):
+        """
+        在通知文件页面爬取通知的内容
+        :param task: (group_title, page_dir, info_url, title)
+        :return: base_infos， content, attachments
+        """
+        # 页面的 bytes 直接交给 lxml 解析，解析完即释放
+        page_content, encoding = get_html_bytes(task[2])
+        return self.parse_notification_infos(task, page_content, encoding)
+
+    @metrics.timed('parse_notification_infos')
+    def parse_notification_infos(self, task, page_content, encoding=None):
+        """
+        解析通知文件页面的内容，按 profile.columns 组成基本信息
+        :param task: (group_title, page_dir, info_url, title)
+        :param page_content: html text or bytes of info url
+        :param encoding: encoding of bytes, see common.parser.parse_html
+        :return: base_infos， content, attachments
+        """
+        group_title, page_dir, info_url, title = task
+        if not page_content:
+            return [], '', []
+        if self.profile.detail == 'trs':
+            fields, contents, attachments = [], parse_trs_page(page_content, encoding), []
+        else:
+            fields, contents, attachments = parse_xxgk_page(info_url, page_content, encoding)
+        specials = {'$group': group_title, '$title': title, '$url': info_url}
+        infos = []
+        for column, source in self.profile.columns:
+            if isinstance(source, int):
+                infos.append(fields[source - 1] if source <= len(fields) else None)
+            elif source in specials:
+                infos.append(specials[source])
+            else:
+                infos.append(source)
+        # encode是为了保存Excel，否则出错
+        return encode_infos(infos), contents, attachments
+
+    def get_values(self, base_infos):
+        """
+        :param base_infos: encoded base infos
+        :return: dict of column -> str, '' if missing
+        """
+        return {self.columns[k]: bytes.decode(base_infos[k]) if base_infos[k] != ' ' else ''
+                for k in range(len(self.columns))}
+
+    def document_numbers(self, base_infos):
+        """
+        :param base_infos: encoded base infos
+        :return: values of profile.dedup_columns, like ['索引号', '文号'] values
+        """
+        values = self.get_values(base_infos)
+        return [values[column] for column in self.profile.dedup_columns if column in values]
+
+    def is_seen(self, task):
+        """
+        通知 url 是否已在其他栏目或之前的运行中写入（需先 configure_seen_index），是则跳过抓取
+        :param task: (group_title, page_dir, info_url, title)
+        :return: bool
+        """
+        seen_index = get_seen_index()
+        return seen_index is not None and seen_index.seen_url(task[2])
+
+    def is_duplicate(self, task, base_infos):
+        """
+        通知的文号或索引号是否已写入，是则记录其 url，之后的运行直接跳过抓取
+        :param task: (group_title, page_dir, info_url, title)
+        :param base_infos: encoded base infos
+        :return: bool
+        """
+        seen_index = get_seen_index()
+        if seen_index is None or seen_index.seen_document(self.document_numbers(base_infos)) is None:
+            return False
+        seen_index.add(task[2], section=self.profile.name)
+        return True
+
+    def mark_seen(self, task, base_infos):
+        """
+        记录已写入的通知
+        """
+        seen_index = get_seen_index()
+        if seen_index is not None:
+            seen_index.add(task[2], self.document_numbers(base_infos), section=self.profile.name)
+
+    def index_notice(self, task, base_infos, contents, path=None):
+        """
+        把写入的通知加入全文检索索引（需先 configure_search_index）
+        :param task: (group_title, page_dir, info_url, title)
+        :param base_infos: encoded base infos
+        :param contents: 通知内容
+        :param path: the written file, returned by write_notification_to_docx
+        """
+        search_index = get_search_index()
+        if search_index is not None:
+            search_index.add(task[2], self.get_values(base_infos), contents, section=self.profile.name,
+                             title=task[3], path=path)
+
+    def write_notification_to_docx(self, save_dir, base_infos, contents, attachments, on_done=None):
+        """
+        保存通知的详细信息到word文件，格式由 common.writers.configure_writer 设置（docx、txt、md 或 jsonl）
+        :param save_dir: 保存的路径
+        :param base_infos: 通知的基本信息，与 columns 对应
+        :param contents: 通知内容
+        :param attachments: 附件信息
+        :param on_done: function(failed) called once the word file and all attachments are saved or failed,
+            failed is the list of attachment urls that failed and should be retried, attachments skipped on purpose
+            (see common.tools.download_file) are not failed, attachments may be downloaded later in the queue
+            of common.attachments
+        :return: the written filename, see common.writers.write_document
+        """
+        values = self.get_values(base_infos)
+        pending = [len(attachments) + 1]
+        failed = []
+        lock = threading.Lock()
+
+        def done(ok=True, file_url=None):
+            with lock:
+                # False 表示按 download_options 跳过或文件不存在，重新爬取也不会成功，不算失败
+                if ok is None:
+                    failed.append(file_url)
+                pending[0] -= 1
+                finished = pending[0] == 0
+            if finished and on_done is not None:
+                on_done(failed)
+
+        title = clean_title(self.profile.docx_title.format(**values))
+        # 写入归档时不创建目录，路径只作为归档中的文件名
+        archived = get_archive() is not None
+        if self.profile.subdir:
+            save_dir = save_dir + '/' + (clean_title(self.profile.subdir.format(**values))
+                                         or self.profile.subdir_default)
+            # 同一目录下的通知可能在多个进程中同时写入
+            if not archived:
+                os.makedirs(save_dir, exist_ok=True)
+        root = save_dir
+        # 下载附件
+        if len(attachments) > 0:
+            # 有附件则要新建目录，断点续爬时目录可能已存在
+            save_dir = save_dir + '/' + title
+            if not archived:
+                os.makedirs(save_dir, exist_ok=True)
+            for attachment in attachments:
+                suffix = attachment[1].split('.')[-1]
+                attach_name = attachment[0] + '.' + suffix if suffix not in attachment[0] else attachment[0]
+                # 不下载的类型（如mp4视频）与大小限制由 configure_download 设置
+                save_attachment(attachment[1], save_dir + '/' + attach_name,
+                                callback=lambda ok, file_url=attachment[1]: done(ok, file_url))
+        # 处理文件名过长
+        filename = save_dir + '/' + title
+        filename = save_dir + '/...' + title[-50:] if len(filename + get_suffix()) > 180 else filename
+        # 写入word文档，jsonl 格式时追加到 root 目录下的 notices.jsonl
+        path = write_document(filename, title, [contents], root=root,
+                              record={'infos': values, 'attachments': [list(attachment) for attachment in attachments]})
+        done()
+        return path
+
+    def craw_task(self, task, store=None, section=None):
+        """
+        爬取并保存一条通知（也供 common.parallel.ParallelRunner 在子进程中调用）
+        :param task: (group_title, page_dir, info_url, title)
+        :param store: common.fingerprint.FingerprintStore, 内容未变化时跳过，此时不按去重索引跳过，以便发现内容变化
+        :param section: 基本信息在 store 中所属的栏目，默认 profile.name，run 中使用 save_dir
+        :return: base_infos, or None if nothing was crawled
+        """
+        if store is None and self.is_seen(task):
+            return None
+        print('Get Information From ', task[2])
+        if store is None:
+            base_infos, contents, attachments = self.get_notification_infos(task)
+        else:
+            _, page_content = get_changed_html_text(task[2], store)
+            if page_content is None:
+                return None
+            base_infos, contents, attachments = self.parse_notification_infos(task, page_content)
+        # 剔除掉没有爬到内容的通知
+        if contents.strip() == '':
+            return None
+        if store is None and self.is_duplicate(task, base_infos):
+            return None
+        path = self.write_notification_to_docx(task[1], base_infos, contents, attachments)
+        if store is not None:
+            # 写入成功后才保存指纹，失败的通知下次运行仍视为新的或变化的
+            store.commit(task[2], section or self.profile.name, base_infos)
+        self.mark_seen(task, base_infos)
+        self.index_notice(task, base_infos, contents, path)
+        return base_infos
+
+    def open_sink(self, save_dir, seen=None, since_url=None):
+        """
+        打开保存基本信息的 save_dir + '.csv'。按去重索引、seen 或 since_url 跳过之前运行中爬取的通知时追加写入，
+        保留之前运行的基本信息，导出 Excel 时读取 csv 中的全部通知
+        :param save_dir: 保存文本的目录
+        :param seen: 同 run
+        :param since_url: 同 run
+        :return: MetadataSink
+        """
+        append = get_seen_index() is not None or seen is not None or since_url is not None
+        return MetadataSink(save_dir + '.csv', self.columns, append=append)
+
+    def finish(self, sink, excel_name, sheet_name):
+        """
+        等待附件下载完成、写入缓存的检索索引与归档分片，关闭 csv 并导出到Excel，excel_name 为 None 时只保存 csv
+        """
+        wait_attachments()
+        flush_search_index()
+        flush_archive()
+        sink.close()
+        if excel_name and sink.count > 0:
+            sink.export_excel(excel_name, sheet_name or self.profile.name)
+            print('Write', sheet_name or self.profile.name, 'Finished!\n')
+
+    def run(self, save_dir, target_url, excel_name=None, sheet_name=None, store=None, seen=None, since_date=None,
+            since_url=None):
+        """
+        主程序运行的入口
+        :param save_dir: 保存文本的目录
+        :param target_url: 要爬取的home url
+        :param excel_name: 保存的Excel表名，为 None 时只保存 csv（save_dir + '.csv'）
+        :param sheet_name: 保存的Excel表sheet名，默认 profile.name
+        :param store: common.fingerprint.FingerprintStore, 增量模式：内容未变化的通知跳过解析与写入，
+            csv 与 Excel 中按 url 合并之前运行中记录的基本信息
+        :param seen: 已爬取过的 url 集合（如 set 或 FingerprintStore），跳过其中的通知
+        :param since_date: 只爬取该日期及之后发布的通知，如 '2019-07-08'
+        :param since_url: 上次爬取到的最新通知 url，列表按时间倒序，遇到它或某一页没有新通知时停止翻页
+        :return: None
+        """
+        # 指标是进程全局的，每个栏目重新计数，save_dir + '.metrics.json' 只包含本栏目
+        metrics.reset()
+        if store is None:
+            # 基本信息随爬取按批写入 csv
+            sink = self.open_sink(save_dir, seen, since_url)
+            for task in self.iter_tasks(save_dir, target_url, seen, since_date, since_url):
+                base_infos = self.craw_task(task, store)
+                if base_infos is not None:
+                    sink.append(base_infos)
+        else:
+            store.reset_stats()
+            # 同一个 profile 可能有多个栏目（如新闻发布的各子栏目），基本信息按 save_dir 分别记录
+            for task in self.iter_tasks(save_dir, target_url, seen, since_date, since_url):
+                self.craw_task(task, store, section=save_dir)
+            store.report()
+            # 未变化的通知不会重新解析，csv 与 Excel 使用 store 中按 url 合并的该栏目所有通知
+            sink = MetadataSink(save_dir + '.csv', self.columns)
+            for row in store.rows(save_dir):
+                sink.append(row)
+        self.finish(sink, excel_name, sheet_name)
+        # 各阶段耗时与吞吐量
+        metrics.dump_json(save_dir + '.metrics.json')
+
+    async def craw_page_async(self, engine, page):
+        """
+        异步爬取一页列表及其所有通知
+        :param engine: AsyncCrawler
+        :param page: (group_title, page_dir, page_url)
+        :return: list of (task, (base_infos, contents, attachments))
+        """
+        tasks = await engine.call(lambda page_url: self.list_tasks(page), page[2])
+        tasks = [task for task in tasks or [] if not self.is_seen(task)]
+        if not tasks:
+            return []
+        results = await asyncio.gather(*[engine.call(lambda info_url, task=task: self.get_notification_infos(task),
+                                                     task[2]) for task in tasks])
+        return [(tasks[k], results[k]) for k in range(len(tasks)) if results[k] is not None]
+
+    async def run_async_pages(self, engine, save_dir, target_url, excel_name=None, sheet_name=None):
+        """
+        异步爬取所有列表页与通知页，按页序写入 word 与 csv，输出与 run 相同
+        :param engine: AsyncCrawler
+        :return: None
+        """
+        # 基本信息随爬取按批写入 csv
+        sink = self.open_sink(save_dir)
+        loop = asyncio.get_running_loop()
+
+        def write(task, base_infos, contents, attachments):
+            # 剔除掉没有爬到内容的通知与重复的通知
+            if contents.strip() != '' and not self.is_duplicate(task, base_infos):
+                path = self.write_notification_to_docx(task[1], base_infos, contents, attachments)
+                self.mark_seen(task, base_infos)
+                self.index_notice(task, base_infos, contents, path)
+                sink.append(base_infos)
+
+        # 所有列表页同时开始，通知页在各自列表页返回后立即展开
+        pages = self.list_pages(save_dir, target_url)
+        futures = [asyncio.ensure_future(self.craw_page_async(engine, page)) for page in pages]
+        for future in futures:
+            for task, (base_infos, contents, attachments) in await future:
+                # 写入 word 与同步下载附件会阻塞，在线程池中运行，写入期间其它页面的请求照常进行；
+                # 按页序逐条等待，写入顺序与 run 相同
+                await loop.run_in_executor(engine.executor, write, task, base_infos, contents, attachments)
+        self.finish(sink, excel_name, sheet_name)
+
+    def run_async(self, save_dir, target_url, excel_name=None, sheet_name=None, max_per_host=8):
+        """
+        异步版本的主程序入口，参数同 run
+        :param max_per_host: 每个 host 的最大并发请求数
+        :return: None
+        """
+        metrics.reset()
+        engine = AsyncCrawler(max_per_host=max_per_host)
+        engine.run(self.run_async_pages(engine, save_dir, target_url, excel_name, sheet_name))
+        metrics.dump_json(save_dir + '.metrics.json')
+
+    def run_pipeline(self, save_dir, target_url, excel_name=None, sheet_name=None, pipeline=None):
+        """
+        流水线版本的主程序入口，抓取、解析、写入分别在不同线程中进行，参数同 run
+        :param pipeline: CrawPipeline, 默认 CrawPipeline()
+        :return: None
+        """
+        metrics.reset()
+        # 基本信息随爬取按批写入 csv，正文写入后即释放
+        sink = self.open_sink(save_dir)
+
+        def fetch(task):
+            page_content, encoding = get_html_bytes(task[2])
+            return None if page_content is None else (page_content, encoding)
+
+        def parse(task, fetched):
+            return task, self.parse_notification_infos(task, *fetched)
+
+        def write(item):
+            task, (base_infos, contents, attachments) = item
+            # 剔除掉没有爬到内容的通知与重复的通知
+            if contents.strip() != '' and not self.is_duplicate(task, base_infos):
+                path = self.write_notification_to_docx(task[1], base_infos, contents, attachments)
+                self.mark_seen(task, base_infos)
+                self.index_notice(task, base_infos, contents, path)
+                sink.append(base_infos)
+
+        pipeline = pipeline or CrawPipeline()
+        tasks = (task for task in self.iter_tasks(save_dir, target_url) if not self.is_seen(task))
+        pipeline.run(tasks, fetch, parse, write)
+        self.finish(sink, excel_name, sheet_name)
+        metrics.dump_json(save_dir + '.metrics.json')
+
+    def run_resumable(self, save_dir, target_url, frontier, excel_name=None, sheet_name=None):
+        """
+        可断点续爬的主程序入口，参数同 run，进度与基本信息记录在 frontier 中，
+        重启后跳过已完成的列表页与通知，中断时正在写入的通知会重新写入
+        :param frontier: common.frontier.Frontier
+        :return: None
+        """
+        metrics.reset()
+        section = sheet_name or self.profile.name
+        pages = self.list_pages(save_dir, target_url)
+        frontier.add(section, 'listing', [page[2] for page in pages], parent=target_url)
+        for page in pages:
+            if frontier.state(page[2]) == WRITTEN:
+                continue
+            tasks = self.list_tasks(page)
+            frontier.add(section, 'info', [task[2] for task in tasks], parent=page[2])
+            frontier.mark(page[2], FETCHED)
+            for task in tasks:
+                if frontier.state(task[2]) == WRITTEN:
+                    continue
+                if self.is_seen(task):
+                    frontier.mark(task[2], WRITTEN)
+                    continue
+                print('Get Information From ', task[2])
+                page_content, encoding = get_html_bytes(task[2])
+                if page_content is None:  # 重试后仍未获取到页面，保持 pending，下次运行时重新爬取
+                    continue
+                base_infos, contents, attachments = self.parse_notification_infos(task, page_content, encoding)
+                # 剔除掉没有爬到内容的通知与重复的通知
+                if contents.strip() == '' or self.is_duplicate(task, base_infos):
+                    frontier.mark(task[2], WRITTEN)
+                    continue
+                frontier.mark(task[2], PARSED, base_infos)
+                frontier.add(section, 'attachment', [attachment[1] for attachment in attachments], parent=task[2])
+
+                # 附件可能在下载队列中稍后完成，全部保存后才把通知标记为 WRITTEN；
+                # 下载失败的附件与其通知保持未完成，也不记入去重索引，下次运行时重新爬取
+                def on_done(failed, task=task, base_infos=base_infos, attachments=attachments):
+                    for attachment in attachments:
+                        if attachment[1] not in failed:
+                            frontier.mark(attachment[1], WRITTEN)
+                    if len(failed) == 0:
+                        frontier.mark(task[2], WRITTEN)
+                        self.mark_seen(task, base_infos)
+
+                path = self.write_notification_to_docx(task[1], base_infos, contents, attachments, on_done)
+                self.index_notice(task, base_infos, contents, path)
+            # 列表页标记为 WRITTEN 之前，附件与检索索引都需写入，中断后不会遗漏
+            wait_attachments()
+            flush_search_index()
+            if all(frontier.state(task[2]) == WRITTEN for task in tasks):
+                frontier.mark(page[2], WRITTEN)
+        flush_archive()
+        # 写入信息到Excel，包括之前中断的运行中已爬取的通知
+        base_info_list = frontier.rows(section)
+        if excel_name and len(base_info_list) > 0:
+            write_excel_file(filename=excel_name, data_list=base_info_list,
+                             sheet_name=section, columns=self.columns)
+            print('Write', section, 'Finished!\n')
+        metrics.dump_json(save_dir + '.metrics.json')
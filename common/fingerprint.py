@@ -0,0 +1,146 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# 页面的变化状态
+NEW = 'new'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+
+
+class FingerprintStore:
+    """
+    记录每个 url 的 ETag、Last-Modified 与内容的 sha256，用于增量爬取：
+    发送条件请求，服务器返回 304 或内容哈希不变时即视为未变化。
+    新的或变化的页面写入成功后才调用 commit 保存指纹与基本信息，写入失败的通知下次仍会重新爬取
+    """
+
+    def __init__(self, db_path):
+        """
+        :param db_path: sqlite file path, like 'data/fingerprint.db'
+        """
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS fingerprint ('
+                          'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, sha256 TEXT, updated REAL)')
+        # 之前版本创建的表没有 section 与 row 列
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(fingerprint)')]
+        for column in ('section', 'row'):
+            if column not in columns:
+                self.conn.execute('ALTER TABLE fingerprint ADD COLUMN %s TEXT' % column)
+        self.conn.commit()
+        self._pending = {}
+        self.stats = {NEW: 0, CHANGED: 0, UNCHANGED: 0}
+
+    def __contains__(self, url):
+        with self._lock:
+            return self.conn.execute('SELECT 1 FROM fingerprint WHERE url = ?', (url,)).fetchone() is not None
+
+    def conditional_headers(self, url):
+        """
+        get headers of conditional request
+        :param url: target url
+        :return: dict, like {'If-None-Match': etag, 'If-Modified-Since': last_modified}
+        """
+        with self._lock:
+            row = self.conn.execute('SELECT etag, last_modified FROM fingerprint WHERE url = ?', (url,)).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers['If-None-Match'] = row[0]
+        if row and row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def not_modified(self, url):
+        """
+        record that server answered 304 Not Modified
+        :param url: target url
+        :return: UNCHANGED
+        """
+        with self._lock:
+            self.stats[UNCHANGED] += 1
+        return UNCHANGED
+
+    def update(self, url, etag, last_modified, text, commit=True):
+        """
+        compare content hash with the stored one and save the new fingerprint
+        :param url: target url
+        :param etag: ETag header or None
+        :param last_modified: Last-Modified header or None
+        :param text: page content
+        :param commit: save the fingerprint now, False to keep a new or changed one until commit(url)
+        :return: NEW, CHANGED or UNCHANGED
+        """
+        sha256 = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        with self._lock:
+            row = self.conn.execute('SELECT sha256 FROM fingerprint WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                status = NEW
+            else:
+                status = UNCHANGED if row[0] == sha256 else CHANGED
+            self.stats[status] += 1
+            if commit or status == UNCHANGED:
+                self._save(url, (etag, last_modified, sha256))
+                self.conn.commit()
+            else:
+                self._pending[url] = (etag, last_modified, sha256)
+        return status
+
+    def _save(self, url, fingerprint, section=None, row=None):
+        # 更新已有的行时保留 rowid，rows() 按首次写入的顺序返回
+        self.conn.execute('INSERT INTO fingerprint (url, etag, last_modified, sha256, updated, section, row) '
+                          'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (url) DO UPDATE SET etag = excluded.etag, '
+                          'last_modified = excluded.last_modified, sha256 = excluded.sha256, updated = excluded.updated, '
+                          'section = IFNULL(excluded.section, section), row = IFNULL(excluded.row, row)',
+                          (url, fingerprint[0], fingerprint[1], fingerprint[2], time.time(), section, row))
+
+    def commit(self, url, section=None, row=None):
+        """
+        save the fingerprint kept by update(url, ..., commit=False) after the notice was written
+        :param url: target url
+        :param section: section name, like '政策解读'
+        :param row: base infos of the notice, merged by url into the csv and Excel of incremental runs
+        :return: None
+        """
+        if row is not None:
+            # base_infos 中是 utf-8 编码的 bytes 或 ' '
+            row = json.dumps([x.decode('utf-8') if isinstance(x, bytes) else x for x in row], ensure_ascii=False)
+        with self._lock:
+            fingerprint = self._pending.pop(url, None)
+            if fingerprint is not None:
+                self._save(url, fingerprint, section, row)
+            elif row is not None:
+                self.conn.execute('UPDATE fingerprint SET section = ?, row = ? WHERE url = ?', (section, row, url))
+            self.conn.commit()
+
+    def rows(self, section):
+        """
+        get base infos of all written notices of section, including those unchanged in this run
+        :param section: section name
+        :return: list of base_infos, encoded like get_notification_infos returns
+        """
+        with self._lock:
+            rows = self.conn.execute('SELECT row FROM fingerprint WHERE section = ? AND row IS NOT NULL '
+                                     'ORDER BY rowid', (section,)).fetchall()
+        return [[x.encode('utf-8') if x != ' ' else x for x in json.loads(row[0])] for row in rows]
+
+    def reset_stats(self):
+        """
+        start counting new, changed and unchanged pages of a new run
+        :return: None
+        """
+        with self._lock:
+            self.stats = {NEW: 0, CHANGED: 0, UNCHANGED: 0}
+
+    def report(self):
+        """
+        print how many pages were new, changed or unchanged
+        :return: stats dict
+        """
+        print('New:', self.stats[NEW], 'Changed:', self.stats[CHANGED], 'Unchanged:', self.stats[UNCHANGED])
+        return dict(self.stats)
+
+    def close(self):
+        self.conn.close()
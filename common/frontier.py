@@ -0,0 +1,95 @@
+import json
+import sqlite3
+import threading
+
+# url 的状态
+PENDING = 'pending'
+FETCHED = 'fetched'
+PARSED = 'parsed'
+WRITTEN = 'written'
+
+
+class Frontier:
+    """
+    基于 SQLite 的持久化 URL 队列，记录列表页（listing）、通知页（info）、附件（attachment）的爬取状态，
+    以及通知的基本信息（Excel 的一行），爬虫中断后重启可跳过已完成的部分
+    """
+
+    def __init__(self, db_path):
+        """
+        :param db_path: sqlite file path, like 'data/frontier.db'
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS frontier ('
+                          'url TEXT PRIMARY KEY, section TEXT, kind TEXT, parent TEXT, state TEXT, row TEXT)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS frontier_parent ON frontier (parent)')
+        self.conn.commit()
+
+    def add(self, section, kind, urls, parent=None):
+        """
+        add urls as pending, urls already in frontier keep their state
+        :param section: section name, like sheet name '政策解读'
+        :param kind: 'listing', 'info' or 'attachment'
+        :param urls: url list
+        :param parent: url of the page where urls come from
+        :return: None
+        """
+        with self._lock:
+            self.conn.executemany('INSERT OR IGNORE INTO frontier (url, section, kind, parent, state) '
+                                  'VALUES (?, ?, ?, ?, ?)', [(url, section, kind, parent, PENDING) for url in urls])
+            self.conn.commit()
+
+    def state(self, url):
+        """
+        get the state of url
+        :param url: target url
+        :return: state, or None if url is unknown
+        """
+        with self._lock:
+            row = self.conn.execute('SELECT state FROM frontier WHERE url = ?', (url,)).fetchone()
+        return row[0] if row else None
+
+    def mark(self, url, state, row=None):
+        """
+        update the state of url
+        :param url: target url
+        :param state: PENDING, FETCHED, PARSED or WRITTEN
+        :param row: base infos of the notification, saved for Excel
+        :return: None
+        """
+        with self._lock:
+            if row is None:
+                self.conn.execute('UPDATE frontier SET state = ? WHERE url = ?', (state, url))
+            else:
+                # base_infos 中是 utf-8 编码的 bytes 或 ' '
+                row = [x.decode('utf-8') if isinstance(x, bytes) else x for x in row]
+                self.conn.execute('UPDATE frontier SET state = ?, row = ? WHERE url = ?',
+                                  (state, json.dumps(row, ensure_ascii=False), url))
+            self.conn.commit()
+
+    def children(self, parent):
+        """
+        get urls found in parent page, in the order they were added
+        :param parent: parent url
+        :return: url list
+        """
+        with self._lock:
+            rows = self.conn.execute('SELECT url FROM frontier WHERE parent = ? ORDER BY rowid', (parent,)).fetchall()
+        return [row[0] for row in rows]
+
+    def rows(self, section):
+        """
+        get base infos of all written notifications of section
+        :param section: section name
+        :return: list of base_infos, encoded like get_notification_infos returns
+        """
+        with self._lock:
+            rows = self.conn.execute('SELECT row FROM frontier WHERE section = ? AND state = ? AND row IS NOT NULL '
+                                     'ORDER BY rowid', (section, WRITTEN)).fetchall()
+        return [[x.encode('utf-8') if x != ' ' else x for x in json.loads(row[0])] for row in rows]
+
+    def close(self):
+        self.conn.close()
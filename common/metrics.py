@@ -0,0 +1,247 @@
+import functools
+import json
+import threading
+import time
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 直方图的桶（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """
+    延迟直方图，只保存各桶计数、总数、总和与最值
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个桶是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        k = 0
+        while k < len(self.buckets) and value > self.buckets[k]:
+            k += 1
+        self.counts[k] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """
+        estimate quantile by bucket upper bound
+        :param q: quantile, like 0.95
+        :return: seconds, or None if empty
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        total = 0
+        for k in range(len(self.counts)):
+            total += self.counts[k]
+            if total >= rank:
+                return min(self.buckets[k], self.max) if k < len(self.buckets) else self.max
+        return self.max
+
+    def merge(self, state):
+        """
+        add the counts of another histogram with the same buckets
+        :param state: dict of counts, count, sum, min and max, see Metrics.snapshot
+        """
+        self.counts = [a + b for a, b in zip(self.counts, state['counts'])]
+        self.count += state['count']
+        self.sum += state['sum']
+        if state['count'] > 0:
+            self.min = state['min'] if self.min is None else min(self.min, state['min'])
+            self.max = state['max'] if self.max is None else max(self.max, state['max'])
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """
+    计数器与延迟直方图，可导出 JSON 摘要或 Prometheus 文本格式
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}
+        self.start_time = time.time()
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        """
+        increase counter
+        :param name: counter name, like 'get_html_text_errors'
+        :param value: increment
+        :return: None
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        """
+        record one latency
+        :param name: histogram name, like 'get_html_text'
+        :param seconds: latency
+        :return: None
+        """
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(self.buckets)
+            self.histograms[name].observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """
+        time a block, eg. `with metrics.timer('write_word_file'): ...`
+        :param name: histogram name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """
+        decorator timing every call of the function
+        :param name: histogram name
+        :return: decorator
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self.start_time = time.time()
+
+    def snapshot(self):
+        """
+        get the raw counters and histogram buckets, a child process returns it to be merged in the parent
+        :return: dict, see merge
+        """
+        with self._lock:
+            histograms = {}
+            for name, histogram in self.histograms.items():
+                histograms[name] = {'counts': list(histogram.counts), 'count': histogram.count, 'sum': histogram.sum,
+                                    'min': histogram.min, 'max': histogram.max}
+            return {'counters': dict(self.counters), 'histograms': histograms}
+
+    def merge(self, snapshot):
+        """
+        add the metrics of another process, like the workers of common.parallel.ParallelRunner
+        :param snapshot: dict returned by snapshot()
+        :return: None
+        """
+        with self._lock:
+            for name, value in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, state in snapshot['histograms'].items():
+                if name not in self.histograms:
+                    self.histograms[name] = Histogram(self.buckets)
+                self.histograms[name].merge(state)
+
+    def summary(self):
+        """
+        get summary of all metrics, with throughput (calls/sec) of each stage
+        :return: dict
+        """
+        with self._lock:
+            elapsed = time.time() - self.start_time
+            histograms = {}
+            for name, histogram in self.histograms.items():
+                histograms[name] = histogram.summary()
+                histograms[name]['per_sec'] = round(histogram.count / elapsed, 3) if elapsed > 0 else None
+            return {'elapsed': round(elapsed, 3), 'counters': dict(self.counters), 'histograms': histograms}
+
+    def dump_json(self, filename):
+        """
+        dump summary to json file
+        :param filename: like 'data/政策解读.metrics.json'
+        :return: summary dict
+        """
+        summary = self.summary()
+        with open(filename, mode='w', encoding='utf-8') as fp:
+            json.dump(summary, fp, ensure_ascii=False, indent=2)
+        return summary
+
+    def prometheus_text(self, prefix='craw_'):
+        """
+        export metrics in Prometheus text format
+        :param prefix: metric name prefix
+        :return: str
+        """
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append('# TYPE %s%s_total counter' % (prefix, name))
+                lines.append('%s%s_total %s' % (prefix, name, value))
+            for name, histogram in sorted(self.histograms.items()):
+                metric = '%s%s_seconds' % (prefix, name)
+                lines.append('# TYPE %s histogram' % metric)
+                total = 0
+                for k in range(len(histogram.buckets)):
+                    total += histogram.counts[k]
+                    lines.append('%s_bucket{le="%s"} %s' % (metric, histogram.buckets[k], total))
+                lines.append('%s_bucket{le="+Inf"} %s' % (metric, histogram.count))
+                lines.append('%s_sum %s' % (metric, histogram.sum))
+                lines.append('%s_count %s' % (metric, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def start_http_server(self, port=9108, host='127.0.0.1'):
+        """
+        expose metrics at http://host:port/metrics during long crawls
+        :param port: listening port
+        :param host: listening host
+        :return: ThreadingHTTPServer, call shutdown() to stop
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# 进程内共享的指标
+metrics = Metrics()
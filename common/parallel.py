@@ -0,0 +1,126 @@
+import multiprocessing
+
+from multiprocessing import Pool
+
+from common.attachments import wait_attachments
+from common.metrics import metrics
+from common.search_index import flush_search_index
+from common.seen_index import get_seen_index
+from common.shared_state import get_shared_state, set_shared_state
+from common.sink import MetadataSink
+from common.writers import flush_archive
+
+# 子进程中的爬虫实例
+_crawler = None
+
+
+def _init_worker(crawler_cls, profile, state):
+    global _crawler
+    set_shared_state(state)
+    _crawler = crawler_cls(profile) if profile is not None else crawler_cls()
+
+
+def _list_tasks(page):
+    # 子进程的指标只记录这一次调用，连同结果返回给主进程合并
+    metrics.reset()
+    try:
+        tasks = _crawler.list_tasks(page)
+    except Exception as e:
+        print('List Tasks Error:', page, repr(e))
+        tasks = []
+    return tasks, metrics.snapshot()
+
+
+def _craw_chunk(chunk):
+    """
+    在子进程中爬取一个分片
+    :param chunk: list of (index, task)
+    :return: list of (index, row), metrics snapshot of the chunk
+    """
+    metrics.reset()
+    results = []
+    for index, task in chunk:
+        try:
+            results.append((index, _crawler.craw_task(task)))
+        except Exception as e:
+            print('Craw Task Error:', task, repr(e))
+            results.append((index, None))
+    # 分片完成前等待本进程队列中的附件，写入缓存的检索索引与归档分片
+    wait_attachments()
+    flush_search_index()
+    flush_archive()
+    return results, metrics.snapshot()
+
+
+def balanced_chunks(tasks, chunk_num):
+    """
+    把任务交错分成 chunk_num 片，相邻的任务（如同一期公报）分散到不同分片，各分片大小最多相差 1
+    :param tasks: task list
+    :param chunk_num: chunk number
+    :return: list of chunks, each chunk is a list of (index, task)
+    """
+    indexed = list(enumerate(tasks))
+    chunk_num = max(1, min(chunk_num, len(indexed)))
+    return [indexed[k::chunk_num] for k in range(chunk_num)] if indexed else []
+
+
+class ParallelRunner:
+    """
+    通用的多进程爬取：列表页与通知页都分片到进程池中，
+    各进程返回的基本信息按原顺序合并写入同一个 csv 与 Excel。
+    crawler_cls 需实现 list_pages(save_dir, target_url)、list_tasks(page) 与 craw_task(task)
+    """
+
+    def __init__(self, crawler_cls, processes=None, chunks_per_process=4, profile=None):
+        """
+        :param crawler_cls: crawler class, like CrawShenZhenGov or ProfileCrawler
+        :param processes: process number, default cpu_count() - 2
+        :param chunks_per_process: chunks of each process, more chunks give a shorter tail
+        :param profile: common.profile.SiteProfile passed to crawler_cls, like ParallelRunner(CrawShenZhenGov,
+            profile=PUBLIC) or ParallelRunner(ProfileCrawler, profile=NEWS), None for the default of crawler_cls
+        """
+        self.crawler_cls = crawler_cls
+        self.profile = profile
+        self.processes = processes or max(1, multiprocessing.cpu_count() - 2)
+        self.chunks_per_process = chunks_per_process
+
+    def run(self, save_dir, target_url, excel_name=None, sheet_name=None):
+        """
+        主程序运行的入口
+        :param save_dir: 保存文本的目录
+        :param target_url: 要爬取的home url
+        :param excel_name: 保存的Excel表名，为 None 时只保存 csv（save_dir + '.csv'）
+        :param sheet_name: 保存的Excel表sheet名
+        :return: merged rows list
+        """
+        # 每个栏目重新计数，子进程的指标合并后写入 save_dir + '.metrics.json'
+        metrics.reset()
+        crawler = self.crawler_cls(self.profile) if self.profile is not None else self.crawler_cls()
+        pages = crawler.list_pages(save_dir, target_url)
+        tasks = []
+        results = []
+        # 限速、重试预算与去重索引显式传入子进程，spawn 启动方式下也共用同一份
+        initargs = (self.crawler_cls, self.profile, get_shared_state())
+        with Pool(self.processes, initializer=_init_worker, initargs=initargs) as pool:
+            # 子进程的指标合并到主进程，见 common.metrics
+            for page_tasks, snapshot in pool.map(_list_tasks, pages, chunksize=1):
+                tasks.extend(page_tasks)
+                metrics.merge(snapshot)
+            chunks = balanced_chunks(tasks, self.processes * self.chunks_per_process)
+            for chunk_results, snapshot in pool.imap_unordered(_craw_chunk, chunks):
+                results.extend(chunk_results)
+                metrics.merge(snapshot)
+        # 按任务原顺序合并
+        rows = [row for index, row in sorted(results, key=lambda result: result[0]) if row is not None]
+        columns = getattr(crawler, 'columns', None)
+        if columns and len(rows) > 0:
+            # 按去重索引跳过了之前运行中爬取的通知时追加写入，保留之前的基本信息，Excel 导出 csv 中的全部通知
+            sink = MetadataSink(save_dir + '.csv', columns, append=get_seen_index() is not None)
+            for row in rows:
+                sink.append(row)
+            sink.close()
+            if excel_name:
+                sink.export_excel(excel_name, sheet_name or save_dir.split('data/')[-1].replace('/', '_'))
+        print('Write', save_dir.split('data/')[-1], 'Finished!\n')
+        metrics.dump_json(save_dir + '.metrics.json')
+        return rows
@@ -0,0 +1,139 @@
+import re
+import threading
+
+from lxml import etree
+
+# 一次遍历同时找到“信息公开”页面的基本信息、正文与附件节点，以及新闻页面的正文节点
+_find_nodes = etree.XPath('//div[@class="xx_con" or @class="news_cont_d_wrap" or @class="fjdown" '
+                          'or @class="TRS_Editor"]')
+_find_script = etree.XPath('script/text()')
+_linkdesc = re.compile(r'var linkdesc="(.*?)";')
+_linkurl = re.compile(r'var linkurl="(.*?)";')
+
+# xx_con 中 p[1] 到 p[7] 依次为：索引号、分类、发布机构、发布日期、名称、文号、主题词
+XXGK_FIELD_NUM = 7
+
+# 按编码缓存的 HTMLParser，lxml 的 parser 不能在多个线程中同时使用，所以每个线程各自缓存
+_local = threading.local()
+
+
+def parse_html(page_content, encoding=None):
+    """
+    解析页面，bytes 按给定的编码直接交给 libxml2 解码，不经过 python str
+    :param page_content: html text, or bytes from common.tools.get_html_bytes
+    :param encoding: encoding of bytes, like 'utf-8' or 'gbk', None means the declared one in html
+    :return: root element
+    """
+    if encoding is None or isinstance(page_content, str):
+        return etree.HTML(page_content)
+    parsers = _local.__dict__.setdefault('parsers', {})
+    if encoding not in parsers:
+        try:
+            parsers[encoding] = etree.HTMLParser(encoding=encoding)
+        except LookupError:  # libxml2 不支持的编码名，按 html 中的声明解析
+            parsers[encoding] = None
+    return etree.HTML(page_content, parsers[encoding])
+
+
+def _find_divs(html):
+    """
+    :return: dict of class -> div list, in document order
+    """
+    divs = {}
+    for node in _find_nodes(html):
+        divs.setdefault(node.get('class'), []).append(node)
+    return divs
+
+
+def _first_text(element):
+    """
+    same as xpath('text()')[0], None if element has no text node
+    """
+    if element.text is not None:
+        return element.text
+    for child in element:
+        if child.tail is not None:
+            return child.tail
+    return None
+
+
+def _paragraphs(divs):
+    """
+    same as '\n'.join(p.xpath('string(.)').strip() for p in html.xpath('//div[@class="..."]//p'))
+    """
+    contents = []
+    seen = set()
+    for div in divs:
+        for paragraph in div.iter('p'):
+            # 嵌套的同名 div 中的段落只取一次
+            if paragraph not in seen:
+                seen.add(paragraph)
+                contents.append(''.join(paragraph.itertext()).strip())
+    return '\n'.join(contents)
+
+
+def _attachments(url, fjdown):
+    """
+    get [name, url] of attachments from `var linkdesc="...";var linkurl="...";` in the script of fjdown
+    """
+    scripts = _find_script(fjdown)
+    if len(scripts) == 0 or scripts[0].find('var linkdesc="";') != -1:
+        return []
+    names = _linkdesc.findall(scripts[0])
+    links = _linkurl.findall(scripts[0])
+    if len(names) == 0 or len(links) == 0:
+        return []
+    attach_names = names[-1].split(';')
+    attach_urls = links[-1].split(';')
+    suffix = url.split('/')[-1]
+    attachments = []
+    for k in range(len(attach_urls)):
+        attach_url = url.replace(suffix, attach_urls[k].split('./')[-1])
+        attach_name = attach_names[k].replace('/', '-').replace('<', '(').replace('>', ')') \
+            if k < len(attach_names) else attach_urls[k].split('/')[-1]
+        attachments.append([attach_name, attach_url])
+    return attachments
+
+
+def parse_xxgk_page(url, page_content, encoding=None):
+    """
+    单次遍历解析“信息公开”格式（xx_con、news_cont_d_wrap、fjdown）的通知页面
+    :param url: info url
+    :param page_content: html text or bytes of info url
+    :param encoding: encoding of bytes, see parse_html
+    :return: fields list, contents, attachments list
+        fields are the first text of p[1] to p[7] in xx_con (None if missing),
+        attachments are [[attach_name, attach_url], ...]
+    """
+    if not page_content:
+        return [None] * XXGK_FIELD_NUM, '', []
+    divs = _find_divs(parse_html(page_content, encoding))
+    fields = [None] * XXGK_FIELD_NUM
+    if 'xx_con' in divs:
+        paragraphs = [child for child in divs['xx_con'][0] if child.tag == 'p']
+        for k in range(min(XXGK_FIELD_NUM, len(paragraphs))):
+            fields[k] = _first_text(paragraphs[k])
+    contents = _paragraphs(divs.get('news_cont_d_wrap', []))
+    attachments = _attachments(url, divs['fjdown'][0]) if 'fjdown' in divs else []
+    return fields, contents, attachments
+
+
+def parse_trs_page(page_content, encoding=None):
+    """
+    解析新闻格式（TRS_Editor）的页面正文
+    :param page_content: html text or bytes
+    :param encoding: encoding of bytes, see parse_html
+    :return: contents
+    """
+    if not page_content:
+        return ''
+    return _paragraphs(_find_divs(parse_html(page_content, encoding)).get('TRS_Editor', []))
+
+
+def encode_infos(infos):
+    """
+    encode base infos for saving Excel, None or empty value becomes ' '
+    :param infos: str list
+    :return: list of bytes or ' '
+    """
+    return [info.encode('utf-8') if info else ' ' for info in infos]
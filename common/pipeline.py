@@ -0,0 +1,107 @@
+import queue
+import threading
+
+# 队列结束标记
+_DONE = object()
+
+
+class CrawPipeline:
+    """
+    流式的 抓取 -> 解析 -> 写入 三段流水线，各段之间用有界队列连接，
+    下游处理不过来时上游会阻塞（背压），内存占用与爬取总量无关
+    """
+
+    def __init__(self, fetch_workers=8, parse_workers=2, write_workers=1, queue_size=32):
+        """
+        :param fetch_workers: threads of fetch stage
+        :param parse_workers: threads of parse stage
+        :param write_workers: threads of write stage
+        :param queue_size: max size of each queue
+        """
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.write_workers = write_workers
+        self.queue_size = queue_size
+        self.errors = 0
+        self.written = 0
+        self._lock = threading.Lock()
+
+    def _stage(self, func, in_queue, out_queue, workers, next_workers, name):
+        """
+        start worker threads of one stage, the last finished worker passes the end mark to next stage
+        :param func: function of one item, returns next item or None (dropped)
+        :param in_queue: input queue
+        :param out_queue: output queue or None
+        :param workers: thread number
+        :param next_workers: thread number of next stage
+        :param name: stage name
+        :return: threads list
+        """
+        alive = [workers]
+
+        def work():
+            while True:
+                item = in_queue.get()
+                if item is _DONE:
+                    break
+                try:
+                    result = func(item)
+                except Exception as e:
+                    print('Pipeline', name, 'Error:', repr(e))
+                    with self._lock:
+                        self.errors += 1
+                    continue
+                if out_queue is not None and result is not None:
+                    out_queue.put(result)
+            with self._lock:
+                alive[0] -= 1
+                last = alive[0] == 0
+            if last and out_queue is not None:
+                for _ in range(next_workers):
+                    out_queue.put(_DONE)
+
+        threads = [threading.Thread(target=work, name='%s-%s' % (name, i), daemon=True) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def run(self, tasks, fetch_func, parse_func, write_func):
+        """
+        运行流水线
+        :param tasks: iterable of tasks, can be a generator which crawls listing pages lazily
+        :param fetch_func: fetch_func(task) -> page content, None means fetch failed
+        :param parse_func: parse_func(task, page_content) -> item, None means nothing to write
+        :param write_func: write_func(item) -> None
+        :return: number of written items
+        """
+        self.errors = 0
+        self.written = 0
+        task_queue = queue.Queue(self.queue_size)
+        page_queue = queue.Queue(self.queue_size)
+        item_queue = queue.Queue(self.queue_size)
+
+        def fetch(task):
+            page_content = fetch_func(task)
+            return None if page_content is None else (task, page_content)
+
+        def parse(pair):
+            # lxml 解析时会释放 GIL，解析线程可与抓取线程并行
+            return parse_func(*pair)
+
+        def write(item):
+            write_func(item)
+            with self._lock:
+                self.written += 1
+
+        threads = self._stage(fetch, task_queue, page_queue, self.fetch_workers, self.parse_workers, 'fetch')
+        threads += self._stage(parse, page_queue, item_queue, self.parse_workers, self.write_workers, 'parse')
+        threads += self._stage(write, item_queue, None, self.write_workers, 0, 'write')
+        try:
+            for task in tasks:
+                task_queue.put(task)
+        finally:
+            for _ in range(self.fetch_workers):
+                task_queue.put(_DONE)
+        for thread in threads:
+            thread.join()
+        return self.written
@@ -0,0 +1,48 @@
+class SiteProfile:
+    """
+    栏目的声明式描述：列表页如何分页、通知链接如何提取、详情页字段如何对应到列、word 文件与附件如何保存。
+    由 common.engine.ProfileCrawler 执行，新增栏目或城市只需新增一个 profile
+    """
+
+    _defaults = {
+        'name': None,  # 栏目名，默认的 Excel sheet 名
+        # 分页脚本的 (前缀, 后缀, 分隔符)，如 ('createPageHTML(', ');', ',')，None 表示没有分页
+        'pagination': None,
+        'page_url': '%s_%s.htm',  # 第 i 页的 url，参数为去掉 '.htm' 的首页 url 与页码
+        # 分组（如往期公报）的 <option> 节点，第一个分组即入口页本身，每个分组保存在以其标题命名的子目录中
+        'group_xpath': None,
+        'group_url': None,  # function(target_url, link, title) -> 分组 url，None 表示按入口页解析相对链接
+        'link_xpath': None,  # 列表页上通知的链接（href 或 script 文本）
+        'link_regex': None,  # 从 link_xpath 的结果中提取链接的正则，None 表示结果即链接
+        'link_prefix': None,  # 把 '../../a.htm' 形式的链接去掉 '..' 后拼到该前缀，None 表示按列表页 url 解析
+        'title_xpath': None,  # 列表页上通知的标题，与 link_xpath 一一对应
+        'detail': 'xxgk',  # 详情页格式：'xxgk'（xx_con、news_cont_d_wrap、fjdown）或 'trs'（TRS_Editor）
+        # [(列名, 来源)]，来源为 xx_con 中第几个 p（1-7）、'$group' 分组标题、'$title' 列表页标题、'$url' 链接，或常量
+        'columns': [],
+        'docx_title': '{标题}',  # word 文件标题，按列名格式化，如 '{发布日期:.4}{标题}'
+        'subdir': None,  # word 文件所在子目录，按列名格式化，如 '{文件类型}'
+        'subdir_default': '其他',  # subdir 格式化结果为空时使用
+        # 用于跨栏目去重的列（见 common.seen_index），文号或索引号相同的通知只写入一次，不在 columns 中的列忽略
+        'dedup_columns': ('索引号', '文号'),
+    }
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: keys of SiteProfile._defaults
+            eg. SiteProfile(name='政务动态', pagination=('createPageHTML(', ');', ','),
+                            link_xpath='//div[@class="zx_ml_list"]/ul/li/span/a/@href', detail='trs')
+        """
+        for key in kwargs:
+            if key not in self._defaults:
+                raise KeyError('Unknown profile option: %s' % key)
+        for key, value in self._defaults.items():
+            setattr(self, key, kwargs.get(key, value))
+
+    def replace(self, **kwargs):
+        """
+        copy the profile with some options changed, eg. POLICY.replace(name='政府文件', link_xpath=...)
+        :return: SiteProfile
+        """
+        options = {key: getattr(self, key) for key in self._defaults}
+        options.update(kwargs)
+        return SiteProfile(**options)
@@ -0,0 +1,186 @@
+import threading
+import time
+import zlib
+
+from urllib.parse import urlencode
+
+from common.metrics import metrics
+from common.sqlite_conn import ProcessConnection
+
+# 默认的响应缓存配置，可通过 configure_response_cache 修改
+_config = {
+    'db_path': None,  # 缓存的 sqlite 文件，like 'data/cache.db'，None 表示不缓存
+    'max_bytes': 1024 * 1024 * 1024,  # 压缩后正文的总字节数上限，超出后按最近最少使用淘汰
+    'ttl': None,  # 默认有效秒数，None 表示不过期
+    'ttls': {},  # 按 url 前缀（栏目）设置有效秒数，最长的前缀优先，like {'http://www.sz.gov.cn/zfgb/': 86400}
+}
+
+
+def cache_key(url, params=None):
+    """
+    :param url: target url
+    :param params: params dict of the request
+    :return: url with sorted params
+    """
+    return url + '?' + urlencode(sorted(params.items())) if params else url
+
+
+class ResponseCache:
+    """
+    磁盘上的 HTTP 响应缓存，以 url 与参数为键，保存 zlib 压缩的原始正文与识别出的编码。
+    修改解析代码后重新运行时直接从缓存读取页面，不再访问网络
+    """
+
+    def __init__(self, db_path, max_bytes=1024 * 1024 * 1024, ttl=None, ttls=None):
+        """
+        :param db_path: sqlite file path, like 'data/cache.db'
+        :param max_bytes: byte budget of compressed bodies
+        :param ttl: default seconds before an entry expires, None means never
+        :param ttls: seconds of url prefixes, like {'http://www.sz.gov.cn/cn/xxgk/zfxxgj/zwdt/': 3600}
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # 最长的前缀优先匹配
+        self.ttls = sorted((ttls or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self._lock = threading.Lock()
+        self._db = ProcessConnection(db_path, wal=True)
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                     'key TEXT PRIMARY KEY, body BLOB, encoding TEXT, size INTEGER, stored REAL, accessed REAL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        # 压缩后正文的总字节数，避免每次写入都统计全表
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER)')
+        conn.execute("INSERT OR IGNORE INTO cache_meta (name, value) "
+                     "SELECT 'total', IFNULL(SUM(size), 0) FROM responses")
+        conn.commit()
+
+    def _connect(self):
+        return self._db.get()
+
+    def ttl_of(self, url):
+        """
+        :param url: target url
+        :return: seconds before the response of url expires, None means never
+        """
+        for prefix, ttl in self.ttls:
+            if url.startswith(prefix):
+                return ttl
+        return self.ttl
+
+    def get_entry(self, url, params=None):
+        """
+        get the cached raw body of url and its encoding
+        :param url: target url
+        :param params: params dict of the request
+        :return: (content bytes, encoding), or None if missing or expired
+        """
+        key = cache_key(url, params)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT body, encoding, stored FROM responses WHERE key = ?', (key,)).fetchone()
+            ttl = self.ttl_of(url)
+            if row is None or (ttl is not None and now - row[2] > ttl):
+                metrics.inc('cache_misses')
+                return None
+            conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            conn.commit()
+        metrics.inc('cache_hits')
+        return zlib.decompress(row[0]), row[1]
+
+    def get(self, url, params=None):
+        """
+        get the cached text of url
+        :param url: target url
+        :param params: params dict of the request
+        :return: html text, or None if missing or expired
+        """
+        entry = self.get_entry(url, params)
+        if entry is None:
+            return None
+        return entry[0].decode(entry[1] or 'utf-8', errors='replace')
+
+    def put(self, url, content, encoding, params=None):
+        """
+        save the raw body of a response and evict the least recently used entries over max_bytes
+        :param url: target url
+        :param content: raw bytes of the response
+        :param encoding: encoding used to decode content, like 'utf-8' or 'gbk'
+        :param params: params dict of the request
+        :return: None
+        """
+        body = zlib.compress(content)
+        now = time.time()
+        key = cache_key(url, params)
+        with self._lock:
+            conn = self._connect()
+            # 多进程同时写入时保证总字节数一致
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            conn.execute('INSERT OR REPLACE INTO responses (key, body, encoding, size, stored, accessed) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', (key, body, encoding, len(body), now, now))
+            total = conn.execute("SELECT value FROM cache_meta WHERE name = 'total'").fetchone()[0]
+            total += len(body) - (row[0] if row else 0)
+            if total > self.max_bytes:
+                # 从最久未访问的开始淘汰，直到低于字节上限
+                evicted = []
+                for old_key, size in conn.execute('SELECT key, size FROM responses ORDER BY accessed'):
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((old_key,))
+                    total -= size
+                conn.executemany('DELETE FROM responses WHERE key = ?', evicted)
+                metrics.inc('cache_evictions', len(evicted))
+            conn.execute("UPDATE cache_meta SET value = ? WHERE name = 'total'", (total,))
+            conn.commit()
+
+    def clear(self, prefix=''):
+        """
+        remove cached responses of urls starting with prefix, like after a section changed its layout
+        :param prefix: url prefix, '' means all
+        :return: number of removed entries
+        """
+        with self._lock:
+            conn = self._connect()
+            count = conn.execute('DELETE FROM responses WHERE key >= ? AND key < ?',
+                                 (prefix, prefix + '\uffff')).rowcount
+            conn.execute("UPDATE cache_meta SET value = (SELECT IFNULL(SUM(size), 0) FROM responses) "
+                         "WHERE name = 'total'")
+            conn.commit()
+        return count
+
+    def close(self):
+        self._db.close()
+
+
+_cache = None
+
+
+def configure_response_cache(**kwargs):
+    """
+    configure the on-disk response cache of get_html_text.
+    eg. configure_response_cache(db_path='data/cache.db', ttl=7 * 86400,
+                                 ttls={'http://www.sz.gov.cn/cn/xxgk/xwfyr/': 3600})
+    :param kwargs: db_path, max_bytes, ttl or ttls
+    :return: None
+    """
+    global _cache
+    for key in kwargs:
+        if key not in _config:
+            raise KeyError('Unknown response cache option: %s' % key)
+    _config.update(kwargs)
+    if _cache is not None:
+        _cache.close()
+    if _config['db_path']:
+        _cache = ResponseCache(_config['db_path'], _config['max_bytes'], _config['ttl'], _config['ttls'])
+    else:
+        _cache = None
+
+
+def get_response_cache():
+    """
+    get the response cache, None if not enabled
+    :return: ResponseCache or None
+    """
+    return _cache
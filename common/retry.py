@@ -0,0 +1,234 @@
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+import requests
+
+from common.metrics import metrics
+
+# 默认的重试配置，可通过 configure_retry 修改
+_config = {
+    'attempts': 4,  # 每个 url 最多请求次数（含第一次）
+    'base_delay': 0.5,  # 第一次重试前的最大等待秒数，之后每次翻倍
+    'max_delay': 30.0,  # 单次等待的上限
+    'retry_statuses': (408, 429, 500, 502, 503, 504),  # 需要重试的状态码，其余 4xx 直接失败
+    'budget': None,  # 本次爬取允许的总重试次数，None 表示不限制
+    'dead_letter_file': None,  # 失败 url 追加写入的 jsonl 文件，None 表示只保存在内存中
+}
+
+# 可重试的网络异常
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError)
+
+
+class RetryableStatus(Exception):
+    """
+    raised by an attempt when the response status should be retried
+    """
+
+    def __init__(self, status, retry_after=None):
+        super().__init__('HTTP %s' % status)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class DeadLetters:
+    """
+    重试失败的 url 列表，可选追加写入 jsonl 文件（多进程追加写入同一个文件），供之后单独重试
+    """
+
+    def __init__(self, filename=None):
+        """
+        :param filename: jsonl file, like 'data/dead_letters.jsonl', or None
+        """
+        self.filename = filename
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, kind, url, reason, **extra):
+        """
+        record a failed url
+        :param kind: 'html' or 'download'
+        :param url: failed url
+        :param reason: last error, like 'HTTP 503' or 'ReadTimeout(...)'
+        :param extra: what a retry pass needs, like filename of download
+        :return: None
+        """
+        record = dict(extra, kind=kind, url=url, reason=reason, time=time.strftime('%Y-%m-%d %H:%M:%S'))
+        with self._lock:
+            self.records.append(record)
+            if self.filename:
+                with open(self.filename, mode='a', encoding='utf-8') as fp:
+                    fp.write(json.dumps(record, ensure_ascii=False) + '\n')
+        metrics.inc('dead_letters')
+
+    def load(self):
+        """
+        get records of all processes
+        :return: list of dict, the latest record of each url
+        """
+        if not self.filename:
+            return list(self.records)
+        records = {}
+        if os.path.exists(self.filename):
+            with open(self.filename, encoding='utf-8') as fp:
+                for line in fp:
+                    if line.strip():
+                        record = json.loads(line)
+                        records[record['url']] = record
+        return list(records.values())
+
+    def retry(self, handlers):
+        """
+        retry pass of dead letters, records still failing are kept
+            eg. dead_letters.retry({'download': lambda r: download_file(r['url'], r['filename'])})
+        :param handlers: dict of kind -> function(record), returns True if succeeded
+        :return: (succeeded number, failed number)
+        """
+        records = self.load()
+        with self._lock:
+            self.records = []
+            if self.filename and os.path.exists(self.filename):
+                os.remove(self.filename)
+        succeeded = 0
+        for record in records:
+            handler = handlers.get(record['kind'])
+            # 重试时失败的 url 会由 retry_call 重新记录
+            if handler is not None and handler(record):
+                succeeded += 1
+            elif handler is None:
+                self.add(**record)
+        return succeeded, len(records) - succeeded
+
+    def report(self):
+        records = self.load()
+        kinds = {}
+        for record in records:
+            kinds[record['kind']] = kinds.get(record['kind'], 0) + 1
+        print('Dead Letters:', len(records), kinds)
+
+
+_budget = None
+_dead_letters = DeadLetters()
+
+
+def configure_retry(**kwargs):
+    """
+    configure the retry engine, the retry budget is shared by worker processes created afterwards,
+    see common.shared_state for pools other than ParallelRunner and WorkStealingScheduler
+    :param kwargs: attempts, base_delay, max_delay, retry_statuses, budget or dead_letter_file
+        eg. configure_retry(attempts=6, budget=500, dead_letter_file='data/dead_letters.jsonl')
+    :return: None
+    """
+    global _budget, _dead_letters
+    for key in kwargs:
+        if key not in _config:
+            raise KeyError('Unknown retry option: %s' % key)
+    _config.update(kwargs)
+    _budget = multiprocessing.Value('i', _config['budget']) if _config['budget'] is not None else None
+    if _dead_letters.filename != _config['dead_letter_file']:
+        _dead_letters = DeadLetters(_config['dead_letter_file'])
+
+
+def get_retry_state():
+    """
+    get the configuration and the shared retry budget, passed to worker processes explicitly,
+    see common.shared_state
+    :return: (config, budget)
+    """
+    return dict(_config), _budget
+
+
+def set_retry_state(state):
+    """
+    use the retry budget of the main process in a worker process
+    :param state: returned by get_retry_state
+    :return: None
+    """
+    global _budget, _dead_letters
+    config, _budget = state
+    _config.update(config)
+    if _dead_letters.filename != _config['dead_letter_file']:
+        _dead_letters = DeadLetters(_config['dead_letter_file'])
+
+
+def get_dead_letters():
+    """
+    :return: DeadLetters of current configuration
+    """
+    return _dead_letters
+
+
+def _take_budget():
+    if _budget is None:
+        return True
+    with _budget.get_lock():
+        if _budget.value <= 0:
+            return False
+        _budget.value -= 1
+        return True
+
+
+def backoff_delay(retry, retry_after=None):
+    """
+    exponential backoff with full jitter: random in [0, min(max_delay, base_delay * 2 ** (retry - 1))]
+    :param retry: retry number, starts from 1
+    :param retry_after: seconds from Retry-After header, used as lower bound
+    :return: seconds
+    """
+    delay = random.uniform(0, min(_config['max_delay'], _config['base_delay'] * 2 ** (retry - 1)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, _config['max_delay']))
+    return delay
+
+
+def check_status(response):
+    """
+    raise RetryableStatus if the status code should be retried
+    :param response: requests response
+    :return: response
+    """
+    if response.status_code in _config['retry_statuses']:
+        retry_after = response.headers.get('Retry-After', '')
+        raise RetryableStatus(response.status_code, float(retry_after) if retry_after.isdigit() else None)
+    return response
+
+
+def retry_call(func, url, kind='html', default=None, attempts=None, **extra):
+    """
+    call func() until it succeeds, retrying network errors and RetryableStatus with backoff.
+    url is recorded in dead letters when attempts or retry budget run out, or at once for other request errors
+    like InvalidSchema or InvalidURL
+    :param func: one attempt, no arguments
+    :param url: target url
+    :param kind: 'html' or 'download', kind of dead letter
+    :param default: returned if all attempts failed
+    :param attempts: max attempts of this call, default is the configured attempts
+    :param extra: saved with dead letter, like filename of download
+    :return: func() result, or default
+    """
+    retry = 0
+    while True:
+        try:
+            return func()
+        except (RetryableStatus,) + RETRY_EXCEPTIONS as e:
+            reason = str(e) if isinstance(e, RetryableStatus) else repr(e)
+            retry_after = e.retry_after if isinstance(e, RetryableStatus) else None
+        except requests.exceptions.RequestException as e:
+            # 无效的链接（如 'javascript:void(0)'）重试也不会成功
+            reason = repr(e)
+            break
+        retry += 1
+        if retry >= (attempts or _config['attempts']):
+            break
+        if not _take_budget():
+            metrics.inc('retry_budget_exhausted')
+            break
+        metrics.inc('retries')
+        time.sleep(backoff_delay(retry, retry_after))
+    print('Give Up:', url, reason)
+    _dead_letters.add(kind, url, reason, **extra)
+    return default
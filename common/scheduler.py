@@ -0,0 +1,171 @@
+import multiprocessing
+import queue
+import time
+
+from common.shared_state import get_shared_state, set_shared_state
+
+
+def _pop_own(worker_id, bounds, lock):
+    """
+    从自己的任务区间头部取一个任务
+    :return: task index, or None if own range is empty
+    """
+    with lock:
+        head, tail = bounds[2 * worker_id], bounds[2 * worker_id + 1]
+        if head < tail:
+            bounds[2 * worker_id] = head + 1
+            return head
+    return None
+
+
+def _steal(worker_id, bounds, lock, worker_num):
+    """
+    从剩余任务最多的进程区间尾部偷一半任务，放入自己的区间
+    :return: True if stole something
+    """
+    with lock:
+        victim, remaining = None, 0
+        for w in range(worker_num):
+            left = bounds[2 * w + 1] - bounds[2 * w]
+            if w != worker_id and left > remaining:
+                victim, remaining = w, left
+        if victim is None:
+            return False
+        half = (remaining + 1) // 2
+        tail = bounds[2 * victim + 1]
+        bounds[2 * victim + 1] = tail - half
+        bounds[2 * worker_id], bounds[2 * worker_id + 1] = tail - half, tail
+        return True
+
+
+def _worker(worker_id, func, tasks, bounds, lock, result_queue, initializer, initargs, finalizer, state):
+    start = time.perf_counter()
+    results = []
+    stats = {'worker': worker_id, 'tasks': 0, 'steals': 0, 'busy': 0.0, 'error': None}
+    # 无论 initializer 或 finalizer 是否出错都返回结果，主进程不会一直等待；
+    # initializer 出错时不执行任务，自己区间内的任务由其他进程偷走
+    try:
+        # 限速、重试预算与去重索引显式传入，spawn 启动的子进程也与主进程共用
+        set_shared_state(state)
+        if initializer is not None:
+            initializer(*initargs)
+        while True:
+            index = _pop_own(worker_id, bounds, lock)
+            if index is None:
+                if _steal(worker_id, bounds, lock, len(bounds) // 2):
+                    stats['steals'] += 1
+                    continue
+                break
+            task_start = time.perf_counter()
+            try:
+                results.append((index, func(tasks[index])))
+            except Exception as e:
+                print('Task Error:', tasks[index], repr(e))
+                results.append((index, None))
+            stats['busy'] += time.perf_counter() - task_start
+            stats['tasks'] += 1
+        if finalizer is not None:
+            finalizer()
+    except Exception as e:
+        print('Worker Error:', worker_id, repr(e))
+        stats['error'] = repr(e)
+    finally:
+        stats['wall'] = time.perf_counter() - start
+        result_queue.put((stats, results))
+
+
+class WorkStealingScheduler:
+    """
+    多进程的工作窃取调度：任务先按连续区间平均分给各进程，
+    进程做完自己的区间后从剩余最多的进程尾部偷走一半，避免个别大任务组拖长尾部。
+    func 与 tasks 需可被 pickle（模块级函数与基本类型）
+    """
+
+    def __init__(self, processes=None, initializer=None, initargs=(), finalizer=None):
+        """
+        :param processes: process number, default cpu_count() - 2
+        :param initializer: called in each worker before running tasks
+        :param initargs: arguments of initializer
+        :param finalizer: called in each worker after its tasks, like common.attachments.wait_attachments
+        """
+        self.processes = processes or max(1, multiprocessing.cpu_count() - 2)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.finalizer = finalizer
+        self.stats = []
+        self.elapsed = 0.0
+
+    def run(self, func, tasks):
+        """
+        run func(task) for every task
+        :param func: module level function
+        :param tasks: task list
+        :return: results list in the order of tasks, None for failed tasks and tasks of a killed worker
+        """
+        tasks = list(tasks)
+        if len(tasks) == 0:
+            self.stats, self.elapsed = [], 0.0
+            return []
+        worker_num = min(self.processes, len(tasks))
+        # 每个进程的任务区间 [head, tail)
+        bounds = multiprocessing.Array('l', 2 * worker_num, lock=False)
+        for w in range(worker_num):
+            bounds[2 * w] = w * len(tasks) // worker_num
+            bounds[2 * w + 1] = (w + 1) * len(tasks) // worker_num
+        lock = multiprocessing.Lock()
+        result_queue = multiprocessing.Queue()
+        state = get_shared_state()
+        start = time.perf_counter()
+        workers = [multiprocessing.Process(target=_worker, args=(w, func, tasks, bounds, lock, result_queue,
+                                                                 self.initializer, self.initargs,
+                                                                 self.finalizer, state))
+                   for w in range(worker_num)]
+        for worker in workers:
+            worker.start()
+        results = [None] * len(tasks)
+        self.stats = []
+        pending = set(range(worker_num))
+        # 先取完结果再 join，避免队列未清空时子进程无法退出
+        while pending:
+            # 在等待之前检查，已退出的子进程放入的结果此时已在队列中
+            exited = all(workers[w].exitcode is not None for w in pending)
+            try:
+                stats, worker_results = result_queue.get(timeout=1)
+            except queue.Empty:
+                if exited:
+                    # 子进程被杀死（如内存不足、段错误）时不会返回结果，其未返回的任务记为失败（None）
+                    for w in sorted(pending):
+                        print('Worker Lost:', w, 'exitcode', workers[w].exitcode)
+                        self.stats.append({'worker': w, 'tasks': 0, 'steals': 0, 'busy': 0.0, 'wall': 0.0,
+                                           'error': 'exitcode %s' % workers[w].exitcode})
+                    break
+                continue
+            pending.discard(stats['worker'])
+            self.stats.append(stats)
+            for index, result in worker_results:
+                results[index] = result
+        for worker in workers:
+            worker.join()
+        self.elapsed = time.perf_counter() - start
+        self.stats.sort(key=lambda stats: stats['worker'])
+        return results
+
+    def utilization(self):
+        """
+        get utilization of each worker in the last run, busy seconds / elapsed seconds of the whole run
+        :return: list of dict, like [{'worker': 0, 'tasks': 10, 'steals': 1, 'busy': 1.2, 'wall': 1.5,
+                 'utilization': 0.8}]
+        """
+        return [dict(stats, utilization=stats['busy'] / self.elapsed if self.elapsed > 0 else 0.0)
+                for stats in self.stats]
+
+    def report(self):
+        """
+        print utilization of each worker in the last run
+        :return: None
+        """
+        print('%-8s %8s %8s %10s %10s %12s' % ('worker', 'tasks', 'steals', 'busy', 'wall', 'utilization'))
+        for stats in self.utilization():
+            print('%-8s %8s %8s %9.2fs %9.2fs %11.1f%%' % (stats['worker'], stats['tasks'], stats['steals'],
+                                                           stats['busy'], stats['wall'], stats['utilization'] * 100))
+        print('Elapsed: %.2fs' % self.elapsed)
@@ -0,0 +1,332 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import zlib
+
+from common.metrics import metrics
+from common.sqlite_conn import ProcessConnection
+from common.tools import get_url_date
+
+# 默认的全文检索索引配置，可通过 configure_search_index 修改
+_config = {
+    'db_path': None,  # 索引的 sqlite 文件，like 'data/search.db'，None 表示不建索引
+    'batch_size': 100,  # 每个进程缓存多少条通知后写入一次
+}
+
+# 汉字、字母与数字连续的一段，标点与空白处断开
+_RUNS = re.compile('[0-9a-z\u3400-\u4dbf\u4e00-\u9fff]+')
+
+
+def tokenize(text):
+    """
+    切分汉字、字母与数字组成的片段，索引每个单字与相邻两字（bigram），不需要分词词典
+    :param text: like '深圳市住房公积金管理办法 2019'
+    :return: set of tokens, like {'深', '圳', '市', ..., '深圳', '圳市', '市住', ..., '20', '01', '19'}
+    """
+    tokens = set()
+    for run in _RUNS.findall((text or '').lower()):
+        tokens.update(run)
+        tokens.update(run[k:k + 2] for k in range(len(run) - 1))
+    return tokens
+
+
+def query_tokens(term):
+    """
+    查询词的 bigram 都出现的通知才可能包含查询词，bigram 比单字选择性更好；只有一个字的片段按单字查询
+    :param term: one query term, like '公积金' or '税'
+    :return: set of tokens
+    """
+    tokens = set()
+    for run in _RUNS.findall(term.lower()):
+        if len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(run[k:k + 2] for k in range(len(run) - 1))
+    return tokens
+
+
+def normalize_date(date):
+    """
+    :param date: like '2019-07-08', '20190708' or '2019年7月8日'
+    :return: like '2019-07-08', '' if date is empty or unknown
+    """
+    numbers = re.findall(r'\d+', date or '')
+    if len(numbers) == 1 and len(numbers[0]) == 8:
+        numbers = [numbers[0][:4], numbers[0][4:6], numbers[0][6:]]
+    if len(numbers) < 3:
+        return ''
+    return '%04d-%02d-%02d' % (int(numbers[0]), int(numbers[1]), int(numbers[2]))
+
+
+class SearchIndex:
+    """
+    爬取过程中增量建立的全文检索倒排索引，保存在 sqlite 中：postings 记录每个词出现在哪些通知中，
+    docs 记录通知的基本信息与压缩后的正文。新通知先缓存在内存中，每 batch_size 条按词排序后一次写入，
+    避免每条通知都随机改写上千个索引页。查询时从文档数最少的词开始求交集，
+    再按发布机构、文件类型、发布日期过滤，最后用正文确认查询词确实连续出现
+    """
+
+    def __init__(self, db_path, batch_size=100):
+        """
+        :param db_path: sqlite file path, like 'data/search.db'
+        :param batch_size: notices buffered before they are written, call flush() before the process exits
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = {}
+        # fork 出的子进程不继承父进程未写入的通知
+        self._db = ProcessConnection(db_path, wal=True, on_fork=self._reset)
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, url TEXT UNIQUE, section TEXT, '
+                     'title TEXT, publisher TEXT, doc_type TEXT, date TEXT, path TEXT, infos TEXT, head TEXT, body BLOB)')
+        conn.execute('CREATE INDEX IF NOT EXISTS docs_date ON docs (date)')
+        conn.execute('CREATE TABLE IF NOT EXISTS postings (token TEXT, doc INTEGER, PRIMARY KEY (token, doc)) '
+                     'WITHOUT ROWID')
+        conn.commit()
+
+    def _connect(self):
+        return self._db.get()
+
+    def _reset(self):
+        self._pending = {}
+
+    @staticmethod
+    def _head(title, infos):
+        # 标题与基本信息，同样可以检索到，查询时不必解析 infos
+        return ' '.join([title] + [value for value in infos.values() if value]).lower()
+
+    @metrics.timed('search_index_add')
+    def add(self, url, infos, contents, section=None, title=None, path=None):
+        """
+        add or replace a notice in the index, written with the next batch
+        :param url: info url
+        :param infos: dict of column -> value, like ProfileCrawler.get_values(base_infos)
+        :param contents: text of the notice
+        :param section: section name, like '政策解读'
+        :param title: title used when infos has no '标题'
+        :param path: the written file, like 'data/政策解读/标题.docx'
+        :return: None
+        """
+        title = infos.get('标题') or title or ''
+        date = normalize_date(infos.get('发布日期')) or normalize_date(get_url_date(url))
+        head = self._head(title, infos)
+        row = (url, section, title, infos.get('发布机构', ''), infos.get('文件类型', ''), date, path,
+               json.dumps(infos, ensure_ascii=False), head, zlib.compress(contents.encode('utf-8')))
+        tokens = tokenize(head + ' ' + contents)
+        with self._lock:
+            self._connect()
+            self._pending[url] = (row, tokens)
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if len(self._pending) == 0:
+            return
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        postings = []
+        for url, (row, tokens) in self._pending.items():
+            old = conn.execute('SELECT id, head, body FROM docs WHERE url = ?', (url,)).fetchone()
+            if old is not None:
+                # 重新切分旧的正文，按主键删除旧的倒排记录，不需要再为 doc 建索引
+                old_tokens = tokenize(old[1] + ' ' + zlib.decompress(old[2]).decode('utf-8'))
+                conn.executemany('DELETE FROM postings WHERE token = ? AND doc = ?',
+                                 [(token, old[0]) for token in old_tokens])
+                conn.execute('DELETE FROM docs WHERE id = ?', (old[0],))
+            doc = conn.execute('INSERT INTO docs (url, section, title, publisher, doc_type, date, path, infos, head, body) '
+                               'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', row).lastrowid
+            postings.extend((token, doc) for token in tokens)
+        # 按词排序后写入，同一索引页的修改集中在一起
+        postings.sort()
+        conn.executemany('INSERT INTO postings (token, doc) VALUES (?, ?)', postings)
+        conn.commit()
+        metrics.inc('search_index_flushed', len(self._pending))
+        self._pending = {}
+
+    def flush(self):
+        """
+        write the buffered notices of this process
+        :return: None
+        """
+        with self._lock:
+            if self._db.owned():
+                self._flush()
+
+    def _candidates(self, conn, tokens):
+        """
+        intersect doc ids of tokens, starting from the rarest token
+        """
+        frequencies = sorted((conn.execute('SELECT COUNT(*) FROM postings WHERE token = ?', (token,)).fetchone()[0],
+                              token) for token in tokens)
+        docs = None
+        for frequency, token in frequencies:
+            if frequency == 0:
+                return set()
+            ids = {row[0] for row in conn.execute('SELECT doc FROM postings WHERE token = ?', (token,))}
+            docs = ids if docs is None else docs & ids
+            if len(docs) == 0:
+                break
+        return docs
+
+    @metrics.timed('search_index_query')
+    def search(self, query='', publisher=None, doc_type=None, date_from=None, date_to=None, section=None, limit=20):
+        """
+        search notices, every whitespace separated term must appear in the title, infos or contents
+        :param query: like '住房 公积金', '' means only filtering
+        :param publisher: part of 发布机构, like '住房和建设局'
+        :param doc_type: 文件类型, like '规范性文件'
+        :param date_from: earliest 发布日期, like '2019-01-01'
+        :param date_to: latest 发布日期, like '2019-12-31'
+        :param section: section name, like '政府公报'
+        :param limit: max number of results
+        :return: list of dict with url, title, section, publisher, doc_type, date, path, score and snippet,
+            notices matching in title or infos first, then by 发布日期 descending
+        """
+        terms = query.lower().split()
+        tokens = set()
+        for term in terms:
+            tokens.update(query_tokens(term))
+        conditions, params = [], []
+        if publisher:
+            conditions.append('publisher LIKE ?')
+            params.append('%' + publisher + '%')
+        if doc_type:
+            conditions.append('doc_type = ?')
+            params.append(doc_type)
+        if date_from:
+            conditions.append('date >= ?')
+            params.append(normalize_date(date_from))
+        if date_to:
+            conditions.append('date <= ?')
+            params.append(normalize_date(date_to))
+        if section:
+            conditions.append('section = ?')
+            params.append(section)
+        results = []
+        with self._lock:
+            conn = self._connect()
+            self._flush()
+            if tokens:
+                docs = self._candidates(conn, tokens)
+                if len(docs) == 0:
+                    return []
+                conditions.append('id IN (SELECT value FROM json_each(?))')
+                params.append(json.dumps(sorted(docs)))
+            sql = 'SELECT id, url, title, section, publisher, doc_type, date, path, head FROM docs'
+            if conditions:
+                sql += ' WHERE ' + ' AND '.join(conditions)
+            sql += ' ORDER BY date DESC'
+            if not terms:
+                sql += ' LIMIT %d' % limit
+            rows = conn.execute(sql, params).fetchall()
+            if terms:
+                # 排序是稳定的，标题命中次数相同时保持发布日期倒序
+                rows.sort(key=lambda row: -sum(row[8].count(term) for term in terms))
+            for doc, url, title, section_name, publisher_name, type_name, date, path, head in rows:
+                if len(results) >= limit:
+                    break
+                result = {'url': url, 'title': title, 'section': section_name, 'publisher': publisher_name,
+                          'doc_type': type_name, 'date': date, 'path': path, 'score': 0, 'snippet': ''}
+                if terms:
+                    # bigram 都出现不代表查询词连续出现，只对排在前面的通知读取正文确认
+                    body = conn.execute('SELECT body FROM docs WHERE id = ?', (doc,)).fetchone()[0]
+                    contents = zlib.decompress(body).decode('utf-8')
+                    text = contents.lower()
+                    if not all(term in text or term in head for term in terms):
+                        continue
+                    result['score'] = sum(text.count(term) + 10 * head.count(term) for term in terms)
+                    position = max(0, min([text.find(term) for term in terms if term in text] or [0]) - 30)
+                    result['snippet'] = ' '.join(contents[position:position + 100].split())
+                results.append(result)
+        return results
+
+    def count(self):
+        """
+        :return: number of indexed notices
+        """
+        with self._lock:
+            conn = self._connect()
+            self._flush()
+            return conn.execute('SELECT COUNT(*) FROM docs').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._db.owned():
+                self._flush()
+            self._db.close()
+
+
+_index = None
+
+
+def configure_search_index(**kwargs):
+    """
+    build the full-text index while crawling, eg. configure_search_index(db_path='data/search.db')
+    :param kwargs: db_path or batch_size
+    :return: None
+    """
+    global _index
+    for key in kwargs:
+        if key not in _config:
+            raise KeyError('Unknown search index option: %s' % key)
+    _config.update(kwargs)
+    if _index is not None:
+        _index.close()
+    _index = SearchIndex(_config['db_path'], _config['batch_size']) if _config['db_path'] else None
+
+
+def get_search_index():
+    """
+    get the full-text index, None if not enabled
+    :return: SearchIndex or None
+    """
+    return _index
+
+
+def flush_search_index():
+    """
+    write the notices buffered in this process, no-op if the index is not enabled
+    :return: None
+    """
+    if _index is not None:
+        _index.flush()
+
+
+if __name__ == '__main__':
+    """
+    Query the index built by crawlers, for example:
+    python -m common.search_index data/search.db 住房 公积金 --publisher 住房和建设局 --since 2019-01-01
+    """
+    parser = argparse.ArgumentParser(description='检索已爬取的通知')
+    parser.add_argument('db_path', help='sqlite file of the index, like data/search.db')
+    parser.add_argument('terms', nargs='*', help='query terms, all of them must appear')
+    parser.add_argument('--publisher', help='part of 发布机构')
+    parser.add_argument('--type', dest='doc_type', help='文件类型')
+    parser.add_argument('--since', help='earliest 发布日期, like 2019-01-01')
+    parser.add_argument('--until', help='latest 发布日期, like 2019-12-31')
+    parser.add_argument('--section', help='section name, like 政府公报')
+    parser.add_argument('--limit', type=int, default=20, help='max number of results')
+    parser.add_argument('--json', action='store_true', help='print results as json lines')
+    args = parser.parse_args()
+
+    if os.path.exists(args.db_path) is False:
+        parser.error('index not found: %s' % args.db_path)
+    index = SearchIndex(args.db_path)
+    start = time.perf_counter()
+    found = index.search(' '.join(args.terms), publisher=args.publisher, doc_type=args.doc_type,
+                         date_from=args.since, date_to=args.until, section=args.section, limit=args.limit)
+    elapsed = time.perf_counter() - start
+    for item in found:
+        if args.json:
+            print(json.dumps(item, ensure_ascii=False))
+        else:
+            print('%s  %s  [%s %s]  %s' % (item['date'], item['title'], item['publisher'], item['doc_type'],
+                                           item['path'] or item['url']))
+            if item['snippet']:
+                print('    ' + item['snippet'])
+    print('%s results of %s notices in %.1fms' % (len(found), index.count(), elapsed * 1000))
+    index.close()
@@ -0,0 +1,206 @@
+import hashlib
+import math
+import multiprocessing
+import threading
+import time
+
+from common.metrics import metrics
+from common.sqlite_conn import ProcessConnection
+
+# 默认的去重索引配置，可通过 configure_seen_index 修改
+_config = {
+    'db_path': None,  # 精确集合的 sqlite 文件，like 'data/seen.db'，None 表示不去重
+    'capacity': 1000000,  # 预计的 url 与文号总数，超出后布隆过滤器的误判率会升高
+    'error_rate': 0.001,  # 布隆过滤器的误判率，误判只会多查一次 sqlite
+}
+
+# 不同写法的括号统一为 '〔〕'，如 '深府[2019]1号' 与 '深府〔2019〕1号' 视为同一文号
+_BRACKETS = str.maketrans({'[': '〔', '［': '〔', '【': '〔', '(': '〔', '（': '〔',
+                           ']': '〕', '］': '〕', '】': '〕', ')': '〕', '）': '〕'})
+
+
+def normalize_number(number):
+    """
+    统一文号、索引号的写法
+    :param number: like '深府〔2019〕 1号'
+    :return: str, '' if number is empty
+    """
+    return ''.join((number or '').split()).translate(_BRACKETS)
+
+
+class BloomFilter:
+    """
+    布隆过滤器：判断不存在时一定不存在，判断存在时有 error_rate 的误判。
+    位数组保存在共享内存中，在创建进程之前构造即可被 fork 出的子进程共用
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        """
+        :param capacity: expected key number
+        :param error_rate: false positive rate at capacity
+        """
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_num = max(1, int(round(self.size / capacity * math.log(2))))
+        self._bits = multiprocessing.RawArray('B', (self.size + 7) // 8)
+        self._lock = multiprocessing.Lock()
+
+    def _positions(self, key):
+        # 双重哈希：第 i 个位置为 h1 + i * h2
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_num)]
+
+    def add(self, key):
+        positions = self._positions(key)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class SeenIndex:
+    """
+    跨栏目、跨运行的去重索引，记录已写入的通知 url 与文号/索引号。
+    先查内存中的布隆过滤器，可能存在时再查 sqlite 中的精确集合，绝大多数新 url 不需要访问磁盘
+    """
+
+    def __init__(self, db_path, capacity=1000000, error_rate=0.001):
+        """
+        :param db_path: sqlite file path, like 'data/seen.db'
+        :param capacity: expected number of urls and document numbers
+        :param error_rate: false positive rate of the bloom filter
+        """
+        self.db_path = db_path
+        self.bloom = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+        self._db = ProcessConnection(db_path)
+        self.stats = {'url': 0, 'document': 0}
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, url TEXT, section TEXT, updated REAL)')
+        conn.commit()
+        for row in conn.execute('SELECT key FROM seen'):
+            self.bloom.add(row[0])
+
+    def _connect(self):
+        return self._db.get()
+
+    def __getstate__(self):
+        # 传给 spawn 启动的子进程时只传共享内存中的布隆过滤器，子进程重新打开 sqlite
+        return {'db_path': self.db_path, 'bloom': self.bloom}
+
+    def __setstate__(self, state):
+        self.db_path = state['db_path']
+        self.bloom = state['bloom']
+        self._lock = threading.Lock()
+        self._db = ProcessConnection(self.db_path)
+        self.stats = {'url': 0, 'document': 0}
+
+    def _has(self, key):
+        if key not in self.bloom:
+            return False
+        with self._lock:
+            return self._connect().execute('SELECT 1 FROM seen WHERE key = ?', (key,)).fetchone() is not None
+
+    def __contains__(self, url):
+        return self._has('url:' + url)
+
+    def seen_url(self, url):
+        """
+        whether url has been written before, counted as a skipped duplicate
+        :param url: info url
+        :return: bool
+        """
+        if self._has('url:' + url):
+            self.stats['url'] += 1
+            metrics.inc('seen_url_skipped')
+            return True
+        return False
+
+    def seen_document(self, numbers):
+        """
+        whether any document number has been written before, counted as a skipped duplicate
+        :param numbers: list of 文号 or 索引号
+        :return: the matched number or None
+        """
+        for number in numbers:
+            number = normalize_number(number)
+            if number and self._has('doc:' + number):
+                self.stats['document'] += 1
+                metrics.inc('seen_document_skipped')
+                return number
+        return None
+
+    def add(self, url, numbers=(), section=None):
+        """
+        record a written notification
+        :param url: info url
+        :param numbers: list of 文号 or 索引号
+        :param section: section name, like '政策解读'
+        :return: None
+        """
+        keys = ['url:' + url] + ['doc:' + normalize_number(number) for number in numbers if normalize_number(number)]
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany('INSERT OR IGNORE INTO seen (key, url, section, updated) VALUES (?, ?, ?, ?)',
+                             [(key, url, section, now) for key in keys])
+            conn.commit()
+        for key in keys:
+            self.bloom.add(key)
+
+    def report(self):
+        """
+        print the skipped duplicates of this process
+        :return: stats dict
+        """
+        print('Skipped duplicates: %s by url, %s by document number' % (self.stats['url'], self.stats['document']))
+        return dict(self.stats)
+
+    def close(self):
+        self._db.close()
+
+
+_index = None
+
+
+def configure_seen_index(**kwargs):
+    """
+    configure the deduplication index of all crawlers.
+    call it in the main process before creating worker processes, so that they share the same bloom filter,
+    see common.shared_state for pools other than ParallelRunner and WorkStealingScheduler
+    :param kwargs: db_path, capacity or error_rate
+        eg. configure_seen_index(db_path='data/seen.db', capacity=200000)
+    :return: None
+    """
+    global _index
+    for key in kwargs:
+        if key not in _config:
+            raise KeyError('Unknown seen index option: %s' % key)
+    _config.update(kwargs)
+    if _index is not None:
+        _index.close()
+    if _config['db_path']:
+        _index = SeenIndex(_config['db_path'], _config['capacity'], _config['error_rate'])
+    else:
+        _index = None
+
+
+def get_seen_index():
+    """
+    get the deduplication index, None if not enabled
+    :return: SeenIndex or None
+    """
+    return _index
+
+
+def set_seen_index(index):
+    """
+    use the index of the main process in a worker process, see common.shared_state
+    :param index: SeenIndex or None, returned by get_seen_index
+    :return: None
+    """
+    global _index
+    _index = index
@@ -0,0 +1,83 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 默认的连接池与重试配置，可通过 configure_session 修改
+_config = {
+    'pool_connections': 10,
+    'pool_maxsize': 10,
+    'host_pool_sizes': {'www.sz.gov.cn': 20},
+    'retries': 0,  # 超时与 5xx 由 common.retry 退避重试，这里不再重复重试
+    'backoff_factor': 0.5,
+    'status_forcelist': (500, 502, 503, 504),
+    'proxies': None,
+}
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+
+
+def configure_session(**kwargs):
+    """
+    configure the shared session, the next get_session() call will build a new one
+    :param kwargs: pool_connections, pool_maxsize, host_pool_sizes, retries, backoff_factor,
+        status_forcelist or proxies
+        eg. configure_session(pool_maxsize=32, host_pool_sizes={'www.sz.gov.cn': 64}, retries=5)
+    :return: None
+    """
+    global _session
+    for key in kwargs:
+        if key not in _config:
+            raise KeyError('Unknown session option: %s' % key)
+    with _lock:
+        _config.update(kwargs)
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def _build_retry():
+    """
+    build the retry policy of adapters
+    :return: urllib3 Retry
+    """
+    return Retry(total=_config['retries'], backoff_factor=_config['backoff_factor'],
+                 status_forcelist=_config['status_forcelist'], raise_on_status=False)
+
+
+def _build_session():
+    """
+    build a keep-alive session, hosts in host_pool_sizes get their own adapter
+    :return: requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=_config['pool_connections'], pool_maxsize=_config['pool_maxsize'],
+                          max_retries=_build_retry())
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    for host, size in _config['host_pool_sizes'].items():
+        host_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=_build_retry())
+        session.mount('http://%s/' % host, host_adapter)
+        session.mount('https://%s/' % host, host_adapter)
+    if _config['proxies']:
+        session.proxies.update(_config['proxies'])
+    return session
+
+
+def get_session():
+    """
+    get the session of current process, a forked process (eg. multiprocessing.Pool) builds its own
+    :return: requests.Session
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
@@ -0,0 +1,29 @@
+from common.retry import get_retry_state, set_retry_state
+from common.seen_index import get_seen_index, set_seen_index
+from common.throttle import get_throttle_state, set_throttle_state
+from common.writers import get_writer_state, set_writer_state
+
+
+def get_shared_state():
+    """
+    各进程共用的状态：common.throttle 的限速与自适应并发、common.retry 的重试预算、common.seen_index 的布隆过滤器
+    与 common.writers 的输出格式和归档目录。
+    fork 出的子进程会继承模块中的全局变量，spawn 与 forkserver（macOS、Windows 与 Python 3.14 起的 POSIX 默认方式）
+    启动的子进程不会，需通过 initargs 显式传入后调用 set_shared_state
+    :return: state dict
+    """
+    return {'throttle': get_throttle_state(), 'retry': get_retry_state(), 'seen_index': get_seen_index(),
+            'writer': get_writer_state()}
+
+
+def set_shared_state(state):
+    """
+    install the state of the main process in a worker process, like Pool(initializer=set_shared_state,
+    initargs=(get_shared_state(),))
+    :param state: returned by get_shared_state
+    :return: None
+    """
+    set_throttle_state(state['throttle'])
+    set_retry_state(state['retry'])
+    set_seen_index(state['seen_index'])
+    set_writer_state(state['writer'])
@@ -0,0 +1,93 @@
+import csv
+import json
+import os
+import threading
+
+from common.tools import write_excel_file
+
+
+class MetadataSink:
+    """
+    通知基本信息的追加式输出，按批写入 csv 或 jsonl 文件（按扩展名选择），
+    爬取过程中即可落盘，Excel 只在最后按需导出
+    """
+
+    def __init__(self, filename, columns, batch_size=100, append=False):
+        """
+        :param filename: output filename, like 'data/政策解读.csv' or 'data/政策解读.jsonl'
+        :param columns: column names, like ['索引号', '省份', '城市', ...]
+        :param batch_size: rows buffered before writing to disk
+        :param append: append to existing file instead of overwriting it
+        """
+        self.filename = filename
+        self.columns = columns
+        self.batch_size = batch_size
+        self.jsonl = filename.endswith('.jsonl')
+        self.count = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        new_file = not append or not os.path.exists(filename) or os.path.getsize(filename) == 0
+        self._fp = open(filename, mode='w' if new_file else 'a', encoding='utf-8', newline='')
+        if not self.jsonl:
+            self._writer = csv.writer(self._fp)
+            if new_file:
+                self._writer.writerow(columns)
+                self._fp.flush()
+
+    def append(self, row):
+        """
+        append one row, rows are written when the batch is full
+        :param row: base_infos, values are str or utf-8 encoded bytes
+        :return: None
+        """
+        row = [x.decode('utf-8') if isinstance(x, bytes) else x for x in row]
+        with self._lock:
+            self._buffer.append(row)
+            self.count += 1
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        if self.jsonl:
+            for row in self._buffer:
+                self._fp.write(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + '\n')
+        else:
+            self._writer.writerows(self._buffer)
+        self._fp.flush()
+        self._buffer = []
+
+    def flush(self):
+        """
+        write buffered rows to disk
+        :return: None
+        """
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            if not self._fp.closed:
+                self._flush()
+                self._fp.close()
+
+    def rows(self):
+        """
+        read all rows back from the output file
+        :return: list of rows
+        """
+        self.flush()
+        with open(self.filename, encoding='utf-8', newline='') as fp:
+            if self.jsonl:
+                return [[item.get(column, ' ') for column in self.columns] for item in map(json.loads, fp)]
+            return list(csv.reader(fp))[1:]
+
+    def export_excel(self, excel_name, sheet_name):
+        """
+        export all rows to a sheet of excel file
+        :param excel_name: excel filename, like 'data/深圳市.xlsx'
+        :param sheet_name: excel sheet name
+        :return: None
+        """
+        write_excel_file(filename=excel_name, data_list=self.rows(), sheet_name=sheet_name, columns=self.columns)
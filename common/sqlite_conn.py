@@ -0,0 +1,47 @@
+import os
+import sqlite3
+
+
+class ProcessConnection:
+    """
+    每个进程各自的 sqlite 连接。sqlite 连接不能跨进程使用，fork 出的子进程第一次使用时重新连接，
+    on_fork 用于同时重置不能继承的其它状态（如正在写入的分片、未写入的缓存）
+    """
+
+    def __init__(self, db_path, wal=False, on_fork=None):
+        """
+        :param db_path: sqlite file path, like 'data/seen.db'
+        :param wal: use WAL journal mode, readers and the writer do not block each other
+        :param on_fork: function called when the connection is (re)opened in a new process
+        """
+        self.db_path = db_path
+        self.wal = wal
+        self.on_fork = on_fork
+        self._conn = None
+        self._pid = None
+
+    def get(self):
+        """
+        :return: sqlite connection of current process
+        """
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+            if self.wal:
+                self._conn.execute('PRAGMA journal_mode=WAL')
+            if self.on_fork is not None:
+                self.on_fork()
+            self._pid = os.getpid()
+        return self._conn
+
+    def owned(self):
+        """
+        :return: bool value, True if the connection is opened by current process
+        """
+        return self._conn is not None and self._pid == os.getpid()
+
+    def close(self):
+        # 只关闭本进程打开的连接，继承自父进程的连接由父进程关闭
+        if self.owned():
+            self._conn.close()
+        self._conn = None
+        self._pid = None
@@ -0,0 +1,245 @@
+import multiprocessing
+import time
+import zlib
+
+import requests
+
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from common.metrics import metrics
+
+# 默认的限速与自适应并发配置，可通过 configure_throttle 修改
+_config = {
+    'rate': None,  # 每个 host 每秒的请求数，None 表示不限速
+    'burst': 5,  # 令牌桶容量，允许的瞬时突发请求数
+    'host_rates': {},  # 单独设置某些 host 的速率，like {'www.sz.gov.cn': 5}
+    'adaptive': False,  # 是否启用 AIMD 自适应并发
+    'initial_limit': 4,
+    'min_limit': 1,
+    'max_limit': 64,
+    'latency_target': 2.0,  # 平均延迟低于该值（秒）才加大并发
+    'error_threshold': 0.05,  # 一个窗口内超时、连接错误与 5xx 的比例高于该值则减半并发
+    'window': 20,  # 每完成多少个请求评估一次
+    'cooldown': 2.0,  # 两次减半之间至少间隔的秒数，同一批失败的并发请求只减半一次
+}
+
+
+class RateLimiter:
+    """
+    按 host 的令牌桶限速，状态保存在共享内存中，同一进程的多线程与 fork 出的子进程（如 multiprocessing.Pool）共用。
+    host 按 crc32 映射到固定数量的桶，哈希冲突的 host 共用一个桶
+    """
+
+    def __init__(self, rate, burst=5, host_rates=None, slots=64):
+        """
+        :param rate: default requests per second of each host
+        :param burst: bucket capacity
+        :param host_rates: rate of some hosts, like {'www.sz.gov.cn': 5}
+        :param slots: bucket number
+        """
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = host_rates or {}
+        self.slots = slots
+        self._lock = multiprocessing.Lock()
+        self._tokens = multiprocessing.Array('d', [float(burst)] * slots, lock=False)
+        self._updated = multiprocessing.Array('d', [time.time()] * slots, lock=False)
+
+    def acquire(self, host):
+        """
+        block until a token of host is available
+        :param host: like 'www.sz.gov.cn'
+        :return: seconds waited
+        """
+        rate = self.host_rates.get(host, self.rate)
+        if not rate:
+            return 0.0
+        slot = zlib.crc32(host.encode('utf-8')) % self.slots
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.time()
+                tokens = min(self.burst, self._tokens[slot] + (now - self._updated[slot]) * rate)
+                self._updated[slot] = now
+                if tokens >= 1:
+                    self._tokens[slot] = tokens - 1
+                    return waited
+                self._tokens[slot] = tokens
+                wait = (1 - tokens) / rate
+            time.sleep(wait)
+            waited += wait
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 自适应并发：每个窗口结束时，延迟与错误率正常则并发上限加 1，连接错误或 5xx/429 的比例超过阈值则减半；
+    超时说明服务器已过载，立即减半。状态保存在共享内存中，线程与 fork 出的子进程共用同一个上限
+    """
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=64, latency_target=2.0, error_threshold=0.05,
+                 window=20, cooldown=2.0):
+        """
+        :param initial_limit: initial concurrency limit
+        :param min_limit: lower bound of limit
+        :param max_limit: upper bound of limit
+        :param latency_target: seconds, limit only grows when mean latency of window is lower
+        :param error_threshold: error rate that halves the limit
+        :param window: requests of each evaluation
+        :param cooldown: min seconds between two decreases
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.error_threshold = error_threshold
+        self.window = window
+        self.cooldown = cooldown
+        self._cond = multiprocessing.Condition()
+        # limit, in_flight, done, errors, latency_sum, last_decrease
+        self._state = multiprocessing.Array('d', [initial_limit, 0, 0, 0, 0.0, 0.0], lock=False)
+
+    @property
+    def limit(self):
+        return int(self._state[0])
+
+    @property
+    def in_flight(self):
+        return int(self._state[1])
+
+    def acquire(self):
+        """
+        block until in flight requests are fewer than limit
+        :return: None
+        """
+        with self._cond:
+            while self._state[1] >= int(self._state[0]):
+                self._cond.wait(1.0)
+            self._state[1] += 1
+
+    def _decrease(self, now):
+        # 冷却时间内不再减半，同一批失败的并发请求只减半一次
+        state = self._state
+        if now - state[5] > self.cooldown:
+            state[0] = max(self.min_limit, int(state[0] * 0.5))
+            state[5] = now
+            metrics.inc('throttle_decreases')
+
+    def release(self, latency, ok, timeout=False):
+        """
+        record the result of a request and adjust limit
+        :param latency: seconds of the request
+        :param ok: False if timeout, connection error or 5xx/429
+        :param timeout: True if the request timed out, the limit is halved at once
+        :return: None
+        """
+        with self._cond:
+            state = self._state
+            state[1] -= 1
+            state[2] += 1
+            state[3] += 0 if ok else 1
+            state[4] += latency
+            now = time.time()
+            if timeout:
+                self._decrease(now)
+                state[2] = state[3] = state[4] = 0
+            elif state[2] >= self.window:
+                # 只在窗口结束时按整个窗口的错误率评估，避免少量请求中的一次错误就减半
+                if state[3] / state[2] > self.error_threshold:
+                    self._decrease(now)
+                elif state[4] / state[2] <= self.latency_target:
+                    state[0] = min(self.max_limit, state[0] + 1)
+                state[2] = state[3] = state[4] = 0
+            self._cond.notify_all()
+
+
+_limiter = None
+_controller = None
+
+
+def configure_throttle(**kwargs):
+    """
+    configure rate limiting and adaptive concurrency of all requests.
+    call it in the main process before creating worker processes, so that they share the same buckets and limit.
+    common.parallel.ParallelRunner and common.scheduler.WorkStealingScheduler pass them to workers explicitly,
+    other pools need initializer=common.shared_state.set_shared_state, initargs=(get_shared_state(),)
+    :param kwargs: rate, burst, host_rates, adaptive, initial_limit, min_limit, max_limit, latency_target,
+        error_threshold, window or cooldown
+        eg. configure_throttle(rate=5, host_rates={'www.sz.gov.cn': 10}, adaptive=True, max_limit=32)
+    :return: None
+    """
+    global _limiter, _controller
+    for key in kwargs:
+        if key not in _config:
+            raise KeyError('Unknown throttle option: %s' % key)
+    _config.update(kwargs)
+    if _config['rate'] or _config['host_rates']:
+        _limiter = RateLimiter(_config['rate'], _config['burst'], _config['host_rates'])
+    else:
+        _limiter = None
+    if _config['adaptive']:
+        _controller = AdaptiveConcurrency(_config['initial_limit'], _config['min_limit'], _config['max_limit'],
+                                          _config['latency_target'], _config['error_threshold'], _config['window'],
+                                          _config['cooldown'])
+    else:
+        _controller = None
+
+
+def get_throttle_state():
+    """
+    get the configuration and the shared limiter and controller, passed to worker processes explicitly
+    so that they are shared under the spawn start method too, see common.shared_state
+    :return: (config, limiter, controller)
+    """
+    return dict(_config), _limiter, _controller
+
+
+def set_throttle_state(state):
+    """
+    use the limiter and controller of the main process in a worker process
+    :param state: returned by get_throttle_state
+    :return: None
+    """
+    global _limiter, _controller
+    config, _limiter, _controller = state
+    _config.update(config)
+
+
+def get_controller():
+    """
+    get the adaptive concurrency controller, None if not enabled
+    :return: AdaptiveConcurrency or None
+    """
+    return _controller
+
+
+@contextmanager
+def throttled(url):
+    """
+    wait for a token and a concurrency slot before requesting url, eg.
+        with throttled(url) as call:
+            r = get_session().get(url)
+            call['status'] = r.status_code
+    timeout, exceptions and 5xx/429 status count as errors of adaptive concurrency
+    :param url: target url
+    :return: dict to record 'status'
+    """
+    if _limiter is not None:
+        waited = _limiter.acquire(urlsplit(url).netloc)
+        if waited > 0:
+            metrics.observe('throttle_wait', waited)
+    controller = _controller
+    if controller is not None:
+        controller.acquire()
+    call = {'status': None}
+    start = time.perf_counter()
+    ok = False
+    timeout = False
+    try:
+        yield call
+        ok = call['status'] is None or (call['status'] < 500 and call['status'] != 429)
+    except requests.exceptions.Timeout:
+        timeout = True
+        raise
+    finally:
+        if controller is not None:
+            controller.release(time.perf_counter() - start, ok, timeout)
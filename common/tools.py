@@ -1,11 +1,18 @@
+import os
 import random
-import time
+import re
+
+from urllib.parse import urlsplit
 
 import docx
-import requests
 import pandas as pd
 
-from openpyxl import load_workbook
+from common.fingerprint import UNCHANGED
+from common.metrics import metrics
+from common.response_cache import get_response_cache
+from common.retry import check_status, get_dead_letters, retry_call, RetryableStatus
+from common.session import get_session
+from common.throttle import throttled
 
 # use different agents to crawl data, avoiding IP banned
 agent = [
@@ -32,33 +39,156 @@ agent = [
 ]
 
 
-def get_html_text(url, params=None, proxies=None, total=3):
+def _fetch_html(url, params=None, proxies=None, total=None):
+    """
+    request a page, timeout, connection error and 429/5xx are retried with exponential backoff,
+    see common.retry.configure_retry. responses are read from and saved to the on-disk cache if configured,
+    see common.response_cache.configure_response_cache
+    :return: (content bytes, encoding), or (None, None) if failed
+    """
+
+    def attempt():
+        headers = {'User-Agent': random.choice(agent)}
+        with throttled(url) as call:
+            r = get_session().get(url, params=params, proxies=proxies, headers=headers, timeout=5)
+            call['status'] = r.status_code
+        return check_status(r)
+
+    cache = get_response_cache()
+    if cache is not None:
+        entry = cache.get_entry(url, params)
+        if entry is not None:
+            return entry
+    r = retry_call(attempt, url, kind='html', attempts=total)
+    if r is None or r.status_code >= 400:
+        if r is not None:  # 404 等不可重试的状态码
+            print('Page Not Found:', url, r.status_code)
+            get_dead_letters().add('html', url, 'HTTP %s' % r.status_code)
+        metrics.inc('get_html_text_errors')
+        return None, None
+    encoding = detect_encoding(r)
+    if cache is not None:
+        cache.put(url, r.content, encoding, params)
+    # 只返回正文，response 对象随函数返回释放
+    return r.content, encoding
+
+
+@metrics.timed('get_html_text')
+def get_html_text(url, params=None, proxies=None, total=None, raw=False):
     """
     get the text of target url
     :param url: target url
     :param params: params dict, like {'param1': 'value1', 'param2': 'value2'}
     :param proxies: proxies dict, like {'http': 'proxy1', 'https': proxy2}, its keys are unchangeable
-    :param total: max repeat times if time out
-    :return: html text or None
+    :param total: max request times, default is the configured attempts
+    :param raw: return the raw bytes of the page instead of text, see also get_html_bytes
+    :return: html text (bytes if raw) or None
+    """
+    content, encoding = _fetch_html(url, params, proxies, total)
+    if content is None or raw:
+        return content
+    return decode_content(content, encoding)
+
+
+@metrics.timed('get_html_bytes')
+def get_html_bytes(url, params=None, proxies=None, total=None):
+    """
+    get the raw bytes of target url and its encoding, for common.parser.parse_html to parse without python str
+    :param url: target url
+    :param params: params dict, like {'param1': 'value1', 'param2': 'value2'}
+    :param proxies: proxies dict, like {'http': 'proxy1', 'https': proxy2}, its keys are unchangeable
+    :param total: max request times, default is the configured attempts
+    :return: (content bytes, encoding), or (None, None) if failed
+    """
+    return _fetch_html(url, params, proxies, total)
+
+
+# html 中声明的编码，只在正文开头查找：<meta charset="utf-8">、<meta content="text/html; charset=gbk">
+# 或 <?xml encoding="utf-8"?>
+_DECLARED_ENCODING = re.compile(rb'<meta[^>]*?charset=["\']*([\w-]+)|^<\?xml[^>]*?encoding=["\']*([\w-]+)', re.I)
+# 只在前 4KB 中查找编码声明
+_SNIFF_SIZE = 4096
+# 每个 host 最近识别出的编码，页面没有声明时使用，同一站点的页面编码通常相同
+_host_encodings = {}
+
+
+def detect_encoding(r):
+    """
+    resolve the encoding of a response without decoding the body: the <meta> charset in the first 4KB,
+    then the charset in Content-Type, then the last encoding of the same host, default 'gbk'
+    :param r: requests response
+    :return: encoding name, like 'utf-8' or 'gbk'
+    """
+    host = urlsplit(r.url).netloc
+    match = _DECLARED_ENCODING.search(r.content[:_SNIFF_SIZE])
+    if match:
+        encoding = (match.group(1) or match.group(2)).decode('ascii').lower()
+    else:
+        content_type = r.headers.get('Content-Type', '')
+        encoding = content_type.split('charset=')[-1].split(';')[0].strip('"\' ').lower() if 'charset=' in content_type else None
+        encoding = encoding or _host_encodings.get(host, 'gbk')
+    # gbk 是 gb2312 的超集，按 gb2312 解码时超出的字会变成乱码
+    encoding = 'gbk' if encoding == 'gb2312' else encoding
+    _host_encodings[host] = encoding
+    return encoding
+
+
+def decode_content(content, encoding):
+    """
+    decode page bytes once
+    :param content: bytes
+    :param encoding: like 'utf-8' or 'gbk'
+    :return: str
     """
     try:
+        return content.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:  # 未知的编码名
+        return content.decode('utf-8', errors='replace')
+
+
+def decode_response(r):
+    """
+    decode response text with the encoding declared in html, the body is decoded only once
+    :param r: requests response
+    :return: html text
+    """
+    r.encoding = detect_encoding(r)
+    return decode_content(r.content, r.encoding)
+
+
+@metrics.timed('get_changed_html_text')
+def get_changed_html_text(url, store, params=None, proxies=None, total=None):
+    """
+    incremental version of get_html_text, sends conditional request and compares content hash
+    :param url: target url
+    :param store: common.fingerprint.FingerprintStore
+    :param params: params dict, like {'param1': 'value1', 'param2': 'value2'}
+    :param proxies: proxies dict, like {'http': 'proxy1', 'https': proxy2}, its keys are unchangeable
+    :param total: max request times, default is the configured attempts
+    :return: (status, html text), status is 'new', 'changed' or 'unchanged' (None if failed),
+        html text is None if unchanged or failed. the fingerprint of a new or changed page is saved
+        by store.commit(url) after the page is written
+    """
+
+    def attempt():
         headers = {'User-Agent': random.choice(agent)}
-        r = requests.get(url, params=params, proxies=proxies, headers=headers, timeout=5)
-    except requests.exceptions.ConnectionError:  # connection error
-        print('Connection Error:', url)
-        return None
-    except Exception:
-        if total > 0:
-            time.sleep(5)  # after 5 seconds continue to craw
-            return get_html_text(url, params, proxies, total - 1)
-        return None
-    # get encodings of the website
-    encodings = requests.utils.get_encodings_from_content(r.text)
-    if len(encodings) == 0:
-        r.encoding = 'gbk'
-    else:
-        r.encoding = encodings[0]
-    return r.text
+        headers.update(store.conditional_headers(url))
+        with throttled(url) as call:
+            r = get_session().get(url, params=params, proxies=proxies, headers=headers, timeout=5)
+            call['status'] = r.status_code
+        return check_status(r)
+
+    r = retry_call(attempt, url, kind='html', attempts=total)
+    if r is None or r.status_code >= 400:
+        if r is not None:
+            print('Page Not Found:', url, r.status_code)
+            get_dead_letters().add('html', url, 'HTTP %s' % r.status_code)
+        return None, None
+    if r.status_code == 304:
+        return store.not_modified(url), None
+    text = decode_response(r)
+    status = store.update(url, r.headers.get('ETag'), r.headers.get('Last-Modified'), text, commit=False)
+    return status, None if status == UNCHANGED else text
 
 
 def get_total_page_num(url, prefix, suffix, delimiter):
@@ -80,29 +210,146 @@ def get_total_page_num(url, prefix, suffix, delimiter):
     return int(page_num)
 
 
-def download_file(file_url, filename, total=3):
+def get_url_date(url):
+    """
+    get publish date from url
+    :param url: info url, like 'http://www.sz.gov.cn/cn/xxgk/zfxxgj/zcjd/201907/t20190708_18040234.htm'
+    :return: date str like '20190708', or None
+    """
+    match = re.search(r'/t(\d{8})_', url)
+    return match.group(1) if match else None
+
+
+def filter_new_urls(info_urls, seen=None, since_date=None, since_url=None):
+    """
+    过滤“最新在前”列表页中已爬取过的链接，用于提前结束翻页
+    :param info_urls: info urls of one listing page, newest first
+    :param seen: container of crawled urls, like set or FingerprintStore, or None
+    :param since_date: skip urls published before this date, like '2019-07-08' or '20190708'
+    :param since_url: newest url of last crawl, it and urls after it are skipped
+    :return: (indexes of new urls, whether to stop walking pages)
+    """
+    since_date = since_date.replace('-', '') if since_date else None
+    indexes = []
+    for k in range(len(info_urls)):
+        if since_url is not None and info_urls[k] == since_url:
+            return indexes, True
+        if seen is not None and info_urls[k] in seen:
+            continue
+        if since_date is not None:
+            date = get_url_date(info_urls[k])
+            if date is not None and date < since_date:
+                continue
+        indexes.append(k)
+    return indexes, len(indexes) == 0 and len(info_urls) > 0
+
+
+# 附件下载的过滤条件，可通过 configure_download 修改
+download_options = {
+    'max_size': None,  # 最大字节数，None 表示不限制
+    'skip_suffixes': ('mp4',),  # 不下载的文件后缀
+    'skip_types': ('video/',),  # 不下载的 Content-Type 前缀
+    'chunk_size': 64 * 1024,
+    'blob_store': None,  # common.blob_store.BlobStore，设置后相同 url 的附件只下载一次
+}
+
+
+def configure_download(**kwargs):
+    """
+    configure the filters of download_file
+    :param kwargs: max_size, skip_suffixes, skip_types, chunk_size or blob_store
+        eg. configure_download(max_size=50 * 1024 * 1024, skip_suffixes=('mp4', 'zip'))
+        or configure_download(blob_store=BlobStore('data/blobs'))
+    :return: None
+    """
+    for key in kwargs:
+        if key not in download_options:
+            raise KeyError('Unknown download option: %s' % key)
+    download_options.update(kwargs)
+
+
+@metrics.timed('download_file')
+def download_file(file_url, filename, total=None):
     """
-    下载文件
+    下载文件，分块写入临时文件 filename.part 后再重命名，中断的下载通过 HTTP Range 续传，
+    超时、连接中断与 429/5xx 按指数退避重试，见 common.retry.configure_retry
     :param file_url: 文件URL
     :param filename: 文件名
-    :param total: 最大下载次数（防止失败）
-    :return: bool value
+    :param total: 最大下载次数，默认使用 configure_retry 的 attempts
+    :return: True if downloaded, False if skipped on purpose (download_options or not found, retrying will not help),
+        None if failed (retries used up or the file cannot be saved), failures are recorded in dead letters
     """
-    try:
-        res = requests.get(file_url)
-        if res.status_code == 200:
-            fp = open(filename, mode='wb')
-            fp.write(res.content)
-            fp.close()
-        else:
-            print('File Not Found:', file_url)
-    except Exception:
-        if total > 0:
-            return download_file(file_url, filename, total - 1)
+    if file_url.split('.')[-1].lower() in download_options['skip_suffixes']:
+        print('Skip File:', file_url)
         return False
+    blob_store = download_options['blob_store']
+    if blob_store is not None and blob_store.link(file_url, filename):
+        return True
+    try:
+        ok = retry_call(lambda: _download_attempt(file_url, filename), file_url, kind='download', attempts=total,
+                        filename=filename)
+    except OSError as e:  # 目录不存在、文件名过长等，跳过该附件，不中断整个栏目
+        print('Save File Error:', filename, repr(e))
+        get_dead_letters().add('download', file_url, repr(e), filename=filename)
+        ok = None
+    if ok is None:  # 重试次数用完
+        metrics.inc('download_file_errors')
+        return None
+    if ok and blob_store is not None:
+        blob_store.add(file_url, filename)
+    return ok
+
+
+def _download_attempt(file_url, filename):
+    """
+    一次下载尝试，网络异常与可重试的状态码向上抛出，由 retry_call 重试
+    :return: True if downloaded, False if skipped or not found
+    """
+    max_size = download_options['max_size']
+    part_name = filename + '.part'
+    offset = os.path.getsize(part_name) if os.path.exists(part_name) else 0
+    headers = {'Range': 'bytes=%s-' % offset} if offset > 0 else {}
+    # 只对建立连接与响应头限速，不包含下载正文的时间
+    with throttled(file_url) as call:
+        res = get_session().get(file_url, headers=headers, stream=True, timeout=30)
+        call['status'] = res.status_code
+    with res:
+        if res.status_code == 416:  # .part 已不可续传，重新下载
+            os.remove(part_name)
+            raise RetryableStatus(416)
+        check_status(res)
+        if res.status_code not in (200, 206):
+            print('File Not Found:', file_url, res.status_code)
+            get_dead_letters().add('download', file_url, 'HTTP %s' % res.status_code, filename=filename)
+            return False
+        if res.status_code == 200:  # 服务器不支持 Range 时从头下载
+            offset = 0
+        if res.headers.get('Content-Type', '').startswith(download_options['skip_types']):
+            print('Skip File:', file_url)
+            return False
+        length = res.headers.get('Content-Length')
+        if max_size and length and offset + int(length) > max_size:
+            # 之前中断留下的 .part 不会再续传
+            if os.path.exists(part_name):
+                os.remove(part_name)
+            print('File Too Large:', file_url)
+            return False
+        size = offset
+        with open(part_name, mode='ab' if offset > 0 else 'wb') as fp:
+            for chunk in res.iter_content(chunk_size=download_options['chunk_size']):
+                size += len(chunk)
+                if max_size and size > max_size:
+                    break
+                fp.write(chunk)
+        if max_size and size > max_size:
+            os.remove(part_name)
+            print('File Too Large:', file_url)
+            return False
+    os.replace(part_name, filename)
     return True
 
 
+@metrics.timed('write_word_file')
 def write_word_file(filename, title, data_list):
     """
     write text data to word file
@@ -119,6 +366,7 @@ def write_word_file(filename, title, data_list):
     doc.save(filename)
 
 
+@metrics.timed('write_excel_file')
 def write_excel_file(filename, data_list, sheet_name='Sheet1', columns=None):
     """
     write list data to excel file, supporting add new sheet
@@ -128,12 +376,14 @@ def write_excel_file(filename, data_list, sheet_name='Sheet1', columns=None):
     :param columns: excel column names
     :return: None
     """
-    writer = pd.ExcelWriter(filename)
     frame = pd.DataFrame(data_list, columns=columns)
-    book = load_workbook(writer.path)
-    writer.book = book
-    frame.to_excel(excel_writer=writer, sheet_name=sheet_name, index=None)
-    writer.close()
+    # 已有的 Excel 文件中追加 sheet，同名 sheet 会被替换
+    if os.path.exists(filename):
+        writer = pd.ExcelWriter(filename, engine='openpyxl', mode='a', if_sheet_exists='replace')
+    else:
+        writer = pd.ExcelWriter(filename, engine='openpyxl')
+    with writer:
+        frame.to_excel(excel_writer=writer, sheet_name=sheet_name, index=None)
 
 
 def filename_replace(filename):
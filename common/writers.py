@@ -0,0 +1,325 @@
+import io
+import json
+import os
+import re
+import zipfile
+
+import docx
+
+from xml.sax.saxutils import escape
+
+from common.archive import ArchiveStore
+from common.attachments import get_attachment_queue
+from common.metrics import metrics
+from common.tools import download_file, write_word_file
+
+# 正文的保存格式，可通过 configure_writer 修改
+_config = {
+    # 'docx'（python-docx）、'docx_fast'（直接写 docx 的 XML 到 zip）、'txt'、'md' 或 'jsonl'
+    'format': 'docx',
+    'jsonl_name': 'notices.jsonl',  # jsonl 格式时每个目录下追加写入的文件名
+    'archive': None,  # common.archive.ArchiveStore，设置后正文与附件追加写入归档分片，不再逐个创建文件与目录
+    'archive_dir': None,  # 归档目录，like 'data/archive'，设置后由 configure_writer 创建 archive
+}
+
+# 各格式的文件后缀，jsonl 格式没有单独的文件
+SUFFIXES = {'docx': '.docx', 'docx_fast': '.docx', 'txt': '.txt', 'md': '.md', 'jsonl': ''}
+
+# XML 1.0 不允许的控制字符，python-docx 遇到会抛出 ValueError
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>')
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>')
+
+_DOCUMENT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>')
+
+# 只定义 Normal 与 Title 两个样式，与 python-docx 的 add_heading(title, 0) 对应
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Title"><w:name w:val="Title"/><w:basedOn w:val="Normal"/>'
+    '<w:qFormat/><w:pPr><w:spacing w:after="300"/></w:pPr><w:rPr><w:sz w:val="52"/></w:rPr></w:style>'
+    '</w:styles>')
+
+_DOCUMENT = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>%s'
+    '<w:sectPr><w:pgSz w:w="12240" w:h="15840"/>'
+    '<w:pgMar w:top="1440" w:right="1800" w:bottom="1440" w:left="1800" w:header="720" w:footer="720" w:gutter="0"/>'
+    '</w:sectPr></w:body></w:document>')
+
+
+def configure_writer(**kwargs):
+    """
+    configure the output format of notices, call it before crawling (and before creating worker processes)
+    :param kwargs: format, jsonl_name, archive or archive_dir
+        eg. configure_writer(format='docx_fast') or configure_writer(format='jsonl')
+        or configure_writer(format='docx_fast', archive_dir='data/archive')
+    :return: None
+    """
+    for key in kwargs:
+        if key not in _config:
+            raise KeyError('Unknown writer option: %s' % key)
+    if kwargs.get('format', _config['format']) not in SUFFIXES:
+        raise ValueError('Unknown writer format: %s' % kwargs['format'])
+    if 'archive_dir' in kwargs and 'archive' not in kwargs:
+        kwargs['archive'] = ArchiveStore(kwargs['archive_dir']) if kwargs['archive_dir'] else None
+    elif kwargs.get('archive') is not None:
+        kwargs['archive_dir'] = kwargs['archive'].root
+    if _config['archive'] is not None and kwargs.get('archive', _config['archive']) is not _config['archive']:
+        _config['archive'].close()
+    _config.update(kwargs)
+
+
+def get_writer_state():
+    """
+    get the writer options for a worker process, see common.shared_state. the archive is passed by its directory,
+    each process opens its own store and writes its own shards
+    :return: dict
+    """
+    return {key: value for key, value in _config.items() if key != 'archive'}
+
+
+def set_writer_state(state):
+    """
+    :param state: returned by get_writer_state
+    :return: None
+    """
+    archive = _config['archive']
+    if archive is not None and archive.root == state['archive_dir']:
+        state = {key: value for key, value in state.items() if key != 'archive_dir'}
+    configure_writer(**state)
+
+
+def get_archive():
+    """
+    get the archive of notices, None if files are written one by one
+    :return: ArchiveStore or None
+    """
+    return _config['archive']
+
+
+def flush_archive():
+    """
+    close the shard written by this process, the archive stays configured and the next notice starts a new shard.
+    call it after the attachments are downloaded, no-op if the archive is not enabled
+    :return: None
+    """
+    if _config['archive'] is not None:
+        _config['archive'].close()
+
+
+def get_suffix(fmt=None):
+    """
+    :param fmt: output format, default the configured one
+    :return: file suffix, like '.docx'
+    """
+    return SUFFIXES[fmt or _config['format']]
+
+
+def _paragraph_xml(text, style=None):
+    """
+    与 python-docx 的 add_paragraph 相同：换行符转为 <w:br/>，制表符转为 <w:tab/>
+    """
+    runs = []
+    for k, line in enumerate(_INVALID_XML.sub('', text).split('\n')):
+        if k > 0:
+            runs.append('<w:br/>')
+        for j, part in enumerate(line.split('\t')):
+            if j > 0:
+                runs.append('<w:tab/>')
+            if part:
+                runs.append('<w:t xml:space="preserve">%s</w:t>' % escape(part))
+    style = '<w:pPr><w:pStyle w:val="%s"/></w:pPr>' % style if style else ''
+    return '<w:p>%s<w:r>%s</w:r></w:p>' % (style, ''.join(runs))
+
+
+def _fast_docx(fp, title, data_list):
+    body = [_paragraph_xml(title, 'Title')] if title else []
+    body.extend(_paragraph_xml(data) for data in data_list)
+    with zipfile.ZipFile(fp, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _RELS)
+        zf.writestr('word/_rels/document.xml.rels', _DOCUMENT_RELS)
+        zf.writestr('word/styles.xml', _STYLES)
+        zf.writestr('word/document.xml', _DOCUMENT % ''.join(body))
+
+
+@metrics.timed('write_fast_docx')
+def write_fast_docx(filename, title, data_list):
+    """
+    write text data to word file without python-docx, the XML parts are written to the zip directly
+    :param filename: word filename, like '/path/filename.docx'
+    :param title: title for word file, or maybe None
+    :param data_list: paragraphs of word content
+    :return: None
+    """
+    _fast_docx(filename, title, data_list)
+
+
+def _text(title, data_list, markdown=False):
+    lines = [('# %s' % title if markdown else title) + '\n\n'] if title else []
+    lines.extend((data.replace('\n', '\n\n') if markdown else data) + '\n' for data in data_list)
+    return ''.join(lines)
+
+
+@metrics.timed('write_text_file')
+def write_text_file(filename, title, data_list, markdown=False):
+    """
+    write text data to txt or Markdown file
+    :param filename: like '/path/filename.txt' or '/path/filename.md'
+    :param title: title, or maybe None
+    :param data_list: paragraphs of content
+    :param markdown: write title as '# title' and separate lines by blank lines
+    :return: None
+    """
+    with open(filename, mode='w', encoding='utf-8') as fp:
+        fp.write(_text(title, data_list, markdown))
+
+
+@metrics.timed('render_document')
+def render_document(title, data_list, fmt):
+    """
+    render a notice to bytes, for appending to an archive
+    :param title: title, or maybe None
+    :param data_list: paragraphs of content
+    :param fmt: 'docx', 'docx_fast', 'txt' or 'md'
+    :return: bytes
+    """
+    if fmt in ('txt', 'md'):
+        return _text(title, data_list, markdown=fmt == 'md').encode('utf-8')
+    buffer = io.BytesIO()
+    if fmt == 'docx_fast':
+        _fast_docx(buffer, title, data_list)
+    else:
+        doc = docx.Document()
+        if title:
+            doc.add_heading(title, 0)
+        for data in data_list:
+            doc.add_paragraph(data)
+        doc.save(buffer)
+    return buffer.getvalue()
+
+
+@metrics.timed('write_jsonl')
+def write_jsonl(filename, title, data_list, record=None, root=None):
+    """
+    append a notice to the jsonl file of root directory, one line per notice
+    :param filename: filename without suffix, like '/path/filename'
+    :param title: title, or maybe None
+    :param data_list: paragraphs of content
+    :param record: extra fields, like {'infos': {...}, 'attachments': [...]}
+    :param root: directory of the jsonl file, default the directory of filename
+    :return: jsonl filename
+    """
+    root = root or os.path.dirname(filename)
+    # 写入归档时子目录不会预先创建
+    if os.path.exists(root) is False:
+        os.makedirs(root, exist_ok=True)
+    line = dict(record or {}, name=os.path.relpath(filename, root), title=title, paragraphs=list(data_list))
+    jsonl_file = os.path.join(root, _config['jsonl_name'])
+    # 一次 write 追加一行，多进程同时写入同一目录也不会交错
+    with open(jsonl_file, mode='a', encoding='utf-8') as fp:
+        fp.write(json.dumps(line, ensure_ascii=False) + '\n')
+    return jsonl_file
+
+
+def write_document(filename, title, data_list, record=None, root=None, fmt=None):
+    """
+    write a notice in the configured format
+    :param filename: filename without suffix, like '/path/filename'
+    :param title: title, or maybe None
+    :param data_list: paragraphs of content
+    :param record: extra fields saved by jsonl format
+    :param root: directory of the jsonl file, default the directory of filename
+    :param fmt: output format, default the configured one
+    :return: the written filename
+    """
+    fmt = fmt or _config['format']
+    if fmt == 'jsonl':
+        return write_jsonl(filename, title, data_list, record, root)
+    path = filename + SUFFIXES[fmt]
+    if _config['archive'] is not None:
+        _config['archive'].add_bytes(path, render_document(title, data_list, fmt))
+    elif fmt == 'docx':
+        write_word_file(filename=path, title=title, data_list=data_list)
+    elif fmt == 'docx_fast':
+        write_fast_docx(path, title, data_list)
+    else:
+        write_text_file(path, title, data_list, markdown=fmt == 'md')
+    return path
+
+
+def _save_attachment(file_url, filename):
+    archive = _config['archive']
+    if archive is None:
+        return download_file(file_url=file_url, filename=filename)
+    tmp_name = archive.temp_path(filename)
+    ok = download_file(file_url=file_url, filename=tmp_name)
+    if ok:
+        archive.add_file(filename, tmp_name)
+        os.remove(tmp_name)
+    return ok
+
+
+def save_attachment(file_url, filename, callback=None):
+    """
+    下载附件，设置了 archive 时先下载到临时文件，追加到归档后删除。
+    设置了 common.attachments.configure_attachments 时放入下载队列后立即返回
+    :param file_url: 文件URL
+    :param filename: 文件名，归档时作为归档中的路径
+    :param callback: function(ok) called after the download finished, skipped or failed, ok is the same as download_file
+    :return: True, False or None same as download_file, or None if queued
+    """
+    queue = get_attachment_queue()
+    if queue is not None:
+        queue.submit(lambda: _save_attachment(file_url, filename), file_url, callback)
+        return None
+    ok = _save_attachment(file_url, filename)
+    if callback is not None:
+        callback(ok)
+    return ok
+
+
+def export_jsonl(jsonl_file, fmt='docx'):
+    """
+    按需把 jsonl 中的通知导出为单独的文件，保存在 jsonl 文件所在的目录
+    :param jsonl_file: like 'data/政策解读/notices.jsonl'
+    :param fmt: 'docx', 'docx_fast', 'txt' or 'md'
+    :return: number of exported notices
+    """
+    if fmt == 'jsonl':
+        raise ValueError('Cannot export jsonl to jsonl')
+    count = 0
+    with open(jsonl_file, encoding='utf-8') as fp:
+        for line in fp:
+            if line.strip():
+                notice = json.loads(line)
+                filename = os.path.join(os.path.dirname(jsonl_file), notice['name'])
+                # 有附件的通知保存在以标题命名的子目录中
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                write_document(filename, notice['title'], notice['paragraphs'], fmt=fmt)
+                count += 1
+    return count
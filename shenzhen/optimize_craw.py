@@ -1,10 +1,21 @@
 import os
 
 import multiprocessing
-from multiprocessing import Pool
-from lxml import etree
 
-from common.tools import get_html_text, download_file, write_word_file
+from common.attachments import configure_attachments, wait_attachments
+from common.frontier import Frontier, PARSED, WRITTEN
+from common.retry import configure_retry, get_dead_letters
+from common.scheduler import WorkStealingScheduler
+from common.search_index import configure_search_index, flush_search_index
+from common.seen_index import configure_seen_index, get_seen_index
+from common.throttle import configure_throttle
+from common.tools import download_file
+from common.writers import flush_archive
+from shenzhen.craw_shenzhen_gov_bulletin import CrawShenZhenBulletin
+
+
+# 政府公报的抓取、解析与写入由 ProfileCrawler 完成，这里只负责多进程调度
+bulletin = CrawShenZhenBulletin()
 
 
 def get_previous_bulletin_urls(url):
@@ -13,140 +24,129 @@ def get_previous_bulletin_urls(url):
     :param url: target url
     :return: option_urls list, option_titles list
     """
-    html_text = get_html_text(url)
-    html = etree.HTML(html_text)
-    links = html.xpath('//select[@name="select3"]/option/@value')
-    option_titles = html.xpath('//select[@name="select3"]/option//text()')[1:]
-    option_urls = [url]
-    for l in range(1, len(links)):
-        if option_titles[l].split('年')[0] == '2019':
-            option_urls.append(url.split('2019')[0] + '2019/' + links[l].split('./')[-1])
-        else:
-            option_urls.append(url.split('2019')[0] + links[l].split('./')[-1])
-    # print(option_urls)
-    return option_urls, option_titles
-
-
-def get_info_urls_of_bulletin(url):
-    """
-    爬取政府公报网页上的链接
-    :param url: target url
-    :return: info_urls list
-    """
-    page_content = get_html_text(url)
-    html = etree.HTML(page_content)
-    script_str = html.xpath('//div[@class="zx_zwgb_left"]//script/text()')[0]
-    # print(script_str)
-    links = script_str.split('opath.push("./')[1:]
-    urls = list(map(lambda s: url + s.split('")')[0], links))
-    return urls
+    return bulletin.get_groups(url)
+
+
+# 子进程中按路径缓存的 Frontier，避免每条通知都重新打开数据库
+_frontiers = {}
+
 
+def get_frontier(frontier_path):
+    if frontier_path is None:
+        return None
+    if frontier_path not in _frontiers:
+        _frontiers[frontier_path] = Frontier(frontier_path)
+    return _frontiers[frontier_path]
 
-def get_notification_infos(previous_title, url):
+
+def list_job(task):
     """
-    在通知文件页面爬取通知的内容
-    :param previous_title: 往年期数
-    :param url: info url
-    :return: base_infos， content, attachments
+    获取一期公报的所有通知，拆成通知级别的任务
+    :param task: (target_url, target_title, save_dir, frontier_path, section)
+    :return: list of (info_url, target_title, save_dir, frontier_path, section)
     """
-    page_content = get_html_text(url)
-    if not page_content:
-        return [], '', []
-    html = etree.HTML(page_content)
-    # ['期数', '索引号', '省份', '城市', '文件类型', '文号', '发布机构', '发布日期', '标题', '主题词']
-    index = html.xpath('//div[@class="xx_con"]/p[1]/text()')
-    aspect = html.xpath('//div[@class="xx_con"]/p[2]/text()')
-    announced_by = html.xpath('//div[@class="xx_con"]/p[3]/text()')
-    announced_date = html.xpath('//div[@class="xx_con"]/p[4]/text()')
-    title = html.xpath('//div[@class="xx_con"]/p[5]/text()')
-    document_num = html.xpath('//div[@class="xx_con"]/p[6]/text()')
-    key_word = html.xpath('//div[@class="xx_con"]/p[7]/text()')
-    base_infos = [[previous_title], index, ['广东省'], ['深圳市'], aspect, document_num, announced_by, announced_date,
-                  title, key_word]
-    base_infos = list(map(lambda x: x[0].encode('utf-8') if len(x) > 0 else ' ', base_infos))
-    # print('This is basic info: ', base_infos)
-    paragraphs = html.xpath('//div[@class="news_cont_d_wrap"]//p')  # 段落信息
-    contents = []
-    for paragraph in paragraphs:
-        contents.append(paragraph.xpath('string(.)').strip())
-    contents = '\n'.join(contents)
-    # deal with attachments
-    attachments = []
-    script_str = html.xpath('//div[@class="fjdown"]/script/text()')[0]
-    # if there are attachments, then get attachments from script
-    if script_str.find('var linkdesc="";') == -1:
-        attach_names = script_str.split('var linkdesc="')[-1].split('";')[0].split(';')
-        attach_urls = script_str.split('var linkurl="')[-1].split('";')[0].split(';')
-        suffix = url.split('/')[-1]
-        for k in range(len(attach_urls)):
-            attach_url = url.replace(suffix, attach_urls[k].split('./')[-1])
-            attach_name = attach_names[k].replace('/', '-').replace('<', '(').replace('>', ')')
-            # print(attach_name, attach_url)
-            attachments.append([attach_name, attach_url])
-    # print(contents)
-    print('Get Content from ******************', url)
-    return base_infos, contents, attachments
-
-
-def write_notification_to_docx(save_dir, base_infos, contents, attachments):
+    target_url, target_title, save_dir, frontier_path, section = task
+    frontier = get_frontier(frontier_path)
+    if frontier is not None and frontier.state(target_url) == WRITTEN:
+        return []
+    tasks = bulletin.list_tasks((target_title, save_dir, target_url))
+    info_urls = [task[2] for task in tasks]
+    if frontier is not None:
+        frontier.add(section, 'info', info_urls, parent=target_url)
+    return [(info_url, target_title, save_dir, frontier_path, section) for info_url in info_urls]
+
+
+def notice_job(task):
     """
-    保存通知的详细信息到word文件
-    :param save_dir: 保存的路径
-    :param base_infos: 通知的基本信息（'索引号', '省份', '城市', '文件类型', '文号', '发布机构', '发布日期', '标题', '主题词'）
-    :param contents: 通知内容
-    :param attachments: 附件信息
+    爬取并保存一条通知
+    :param task: (info_url, target_title, save_dir, frontier_path, section)
     :return: None
     """
-    aspect = bytes.decode(base_infos[-6]) if base_infos[-6] != ' ' else '其他'
-    aspect_dir = save_dir + '/' + aspect
-    if os.path.exists(aspect_dir) is False:
-        os.mkdir(aspect_dir)
-    title = bytes.decode(base_infos[-2]).replace('/', '-').replace(' ', '') \
-        .replace('<', '(').replace('>', ')').replace('"', '-')
-    # 下载附件
-    if len(attachments) > 0:
-        # 有附件则要新建目录
-        aspect_dir = aspect_dir + '/' + title
-        os.mkdir(aspect_dir)
-        for attachment in attachments:
-            suffix = attachment[1].split('.')[-1]
-            attach_name = attachment[0] + '.' + suffix if suffix not in attachment[0] else attachment[0]
-            # 不下载mp4视频
-            if suffix != 'mp4':
-                download_file(file_url=attachment[1], filename=aspect_dir + '/' + attach_name)
-    # 处理文件名过长
-    filename = aspect_dir + '/' + title + '.docx'
-    filename = aspect_dir + '/...' + title[-50:] + '.docx' if len(filename) > 180 else filename
-    # 写入word文档
-    write_word_file(filename=filename,
-                    title=title, data_list=[contents])
-
-
-def craw_job(target_url, target_title, save_dir):
+    info_url, target_title, save_dir, frontier_path, section = task
+    frontier = get_frontier(frontier_path)
+    if frontier is not None and frontier.state(info_url) == WRITTEN:
+        return
+    notice = (target_title, save_dir, info_url, None)
+    # 已在其他栏目或之前的运行中写入
+    if bulletin.is_seen(notice):
+        if frontier is not None:
+            frontier.mark(info_url, WRITTEN)
+        return
+    # print('Get Information From ', info_url)
+    base_infos, contents, attachments = bulletin.get_notification_infos(notice)
+    if len(base_infos) == 0:  # 重试后仍未获取到页面，保持 pending，下次运行时重新爬取
+        return
+    # 剔除掉没有爬到内容的通知与重复的通知
+    if contents.strip() != '' and not bulletin.is_duplicate(notice, base_infos):
+        if frontier is not None:
+            frontier.mark(info_url, PARSED, base_infos)
+            frontier.add(section, 'attachment', [attachment[1] for attachment in attachments], parent=info_url)
+
+        # 附件在下载队列中全部保存后才把通知标记为 WRITTEN，中断或下载失败后重新运行会重新下载
+        def on_done(failed):
+            if frontier is not None:
+                for attachment in attachments:
+                    if attachment[1] not in failed:
+                        frontier.mark(attachment[1], WRITTEN)
+                if len(failed) == 0:
+                    frontier.mark(info_url, WRITTEN)
+            if len(failed) == 0:
+                bulletin.mark_seen(notice, base_infos)
+
+        path = bulletin.write_notification_to_docx(save_dir, base_infos, contents, attachments, on_done)
+        bulletin.index_notice(notice, base_infos, contents, path)
+    elif frontier is not None:
+        frontier.mark(info_url, WRITTEN)
+
+
+def finish_worker():
+    """
+    进程结束前等待队列中的附件下载完成，写入缓存的检索索引与归档分片
+    :return: None
     """
-    设置爬虫任务
+    wait_attachments()
+    flush_search_index()
+    flush_archive()
+
+
+def craw_job(target_url, target_title, save_dir, frontier_path=None, section='政府公报'):
+    """
+    设置爬虫任务：在一个进程中爬取一整期公报
     :param target_url: url
     :param target_title: title
     :param save_dir: save directory
+    :param frontier_path: sqlite file of Frontier, None means no resuming
+    :param section: section name recorded in frontier
     :return: None
     """
-    info_urls = get_info_urls_of_bulletin(target_url)  # 政府公报
-    for info_url in info_urls:
-        if '' != info_url:
-            # print('Get Information From ', info_url)
-            base_infos, contents, attachments = get_notification_infos(target_title, info_url)
-            # 剔除掉没有爬到内容的通知
-            if contents.strip() != '':
-                write_notification_to_docx(save_dir, base_infos, contents, attachments)
+    tasks = list_job((target_url, target_title, save_dir, frontier_path, section))
+    for task in tasks:
+        notice_job(task)
+    finish_worker()
+    frontier = get_frontier(frontier_path)
+    # 附件下载失败的通知保持未完成，这一期下次运行时重新爬取
+    if frontier is not None and all(frontier.state(task[0]) == WRITTEN for task in tasks):
+        frontier.mark(target_url, WRITTEN)
 
 
 if __name__ == '__main__':
     """
     This file is optimized for 'craw_shenzhen_gov_bulletin.py'.
     This file mainly implements crawling data with multi processes, which can improve the efficiency of crawling. 
+    Bulletin issues differ a lot in size, so issues are split into notices and scheduled by work stealing:
+    an idle process takes pending notices of the busiest one instead of waiting for it.
     """
     MAX_CPU_NUM = multiprocessing.cpu_count()
-    pool = Pool(MAX_CPU_NUM - 2)
+    # 各进程共享的限速与自适应并发，需在创建进程之前设置
+    configure_throttle(host_rates={'www.sz.gov.cn': 10}, adaptive=True, max_limit=32)
+    configure_retry(budget=1000, dead_letter_file='bulletin_dead_letters.jsonl')
+    # 跨栏目、跨运行去重，布隆过滤器需在创建进程之前构造
+    configure_seen_index(db_path='bulletin_seen.db')
+    # 爬取的同时建立全文检索索引，python -m common.search_index bulletin_search.db 关键词
+    configure_search_index(db_path='bulletin_search.db')
+    # 附件在各进程的下载线程中下载，不阻塞通知的爬取；进程结束前等待队列清空并写入检索索引
+    configure_attachments(workers=8, max_per_host=4)
+    scheduler = WorkStealingScheduler(MAX_CPU_NUM - 2, finalizer=finish_worker)
     # 政府公报
     save_dirs = [
         'bulletin'
@@ -155,17 +155,32 @@ if __name__ == '__main__':
         'http://www.sz.gov.cn/zfgb/2019/gb1099_181240/'
     ]
 
+    # 记录爬取进度，程序中断后重新运行会跳过已完成的期数与通知
+    frontier_path = 'bulletin_frontier.db'
+    frontier = Frontier(frontier_path)
     for i in range(0, len(target_urls)):
         if os.path.exists(save_dirs[i]) is False:
             os.mkdir(save_dirs[i])
         previous_urls, previous_titles = get_previous_bulletin_urls(target_urls[i])
+        frontier.add(save_dirs[i], 'listing', previous_urls, parent=target_urls[i])
+        issue_tasks = []
         for p in range(len(previous_urls)):
             # 创建往期目录
             previous_dir = save_dirs[i] + '/' + previous_titles[p]
             if os.path.exists(previous_dir) is False:
                 os.mkdir(previous_dir)
-            # 爬取往期通知
-            pool.apply_async(craw_job, args=(previous_urls[p], previous_titles[p], previous_dir,))
-
-    pool.close()  # 关闭进程池，不再接受任务提交
-    pool.join()  # 等待所有任务完成
+            issue_tasks.append((previous_urls[p], previous_titles[p], previous_dir, frontier_path, save_dirs[i]))
+        # 先并行获取各期的通知列表，再把所有通知交给调度器
+        notice_tasks = [task for tasks in scheduler.run(list_job, issue_tasks) if tasks for task in tasks]
+        scheduler.run(notice_job, notice_tasks)
+        scheduler.report()
+        for previous_url in previous_urls:
+            infos = frontier.children(previous_url)
+            if len(infos) > 0 and all(frontier.state(info_url) == WRITTEN for info_url in infos):
+                frontier.mark(previous_url, WRITTEN)
+    frontier.close()
+    # 对重试后仍失败的附件再下载一次，其余失败的通知见 dead_letters.jsonl，下次运行时重新爬取
+    dead_letters = get_dead_letters()
+    dead_letters.retry({'download': lambda record: download_file(record['url'], record['filename'])})
+    dead_letters.report()
+    get_seen_index().report()
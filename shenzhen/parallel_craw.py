@@ -0,0 +1,52 @@
+import os
+
+from common.attachments import configure_attachments
+from common.parallel import ParallelRunner
+from common.retry import configure_retry, get_dead_letters
+from common.search_index import configure_search_index
+from common.seen_index import configure_seen_index
+from common.throttle import configure_throttle
+from common.tools import download_file
+from shenzhen.craw_shenzhen_gov_bulletin import CrawShenZhenBulletin
+from shenzhen.craw_shenzhen_gov_files import CrawShenZhenGov
+from shenzhen.craw_shenzhen_gov_reports import CrawShenZhenReport
+from shenzhen.craw_shenzhen_gov_work import CrawShenZhenWork
+from shenzhen.craw_shenzhen_news import CrawShenZhenNews
+
+if __name__ == '__main__':
+    """
+    This file crawls every section with multi processes through common.parallel.ParallelRunner.
+    Listing pages and notifications are sharded across the pool, and metadata rows of all processes
+    are merged into one csv file and one Excel sheet per section.
+    """
+    # (爬虫类, 保存目录, 入口 url, 是否写入Excel)
+    sections = [
+        (CrawShenZhenGov, 'data/政策解读', 'http://www.sz.gov.cn/cn/xxgk/zfxxgj/zcjd/index_wzjd_42052.htm', True),
+        (CrawShenZhenBulletin, 'data/政府公报', 'http://www.sz.gov.cn/zfgb/2019/gb1099_181240/', True),
+        (CrawShenZhenReport, 'data/政府工作报告', 'http://www.sz.gov.cn/cn/xxgk/zfxxgj/gzbg/gwyzf', True),
+        (CrawShenZhenWork, 'data/政务动态', 'http://www.sz.gov.cn/cn/xxgk/zfxxgj/zwdt/index.htm', False),
+        (CrawShenZhenNews, 'data/新闻发布/新闻发布稿', 'http://www.sz.gov.cn/cn/xxgk/xwfyr/xwtg/index.htm', False),
+    ]
+
+    # 各进程共享的限速与自适应并发，需在创建进程池之前设置
+    configure_throttle(host_rates={'www.sz.gov.cn': 10}, adaptive=True, max_limit=32)
+    configure_retry(budget=5000, dead_letter_file='data/dead_letters.jsonl')
+    # 同一通知常出现在多个栏目中（如政府文件与政府公报），只抓取、写入一次
+    os.makedirs('data', exist_ok=True)
+    configure_seen_index(db_path='data/seen.db')
+    # 爬取的同时建立全文检索索引，python -m common.search_index data/search.db 关键词 --publisher 发布机构
+    configure_search_index(db_path='data/search.db')
+    # 附件放入各进程的下载队列，不阻塞通知的爬取
+    configure_attachments(workers=8, max_per_host=4)
+    for crawler_cls, save_dir, target_url, to_excel in sections:
+        if os.path.exists(save_dir) is False:
+            os.makedirs(save_dir)
+        ParallelRunner(crawler_cls).run(save_dir=save_dir,
+                                        target_url=target_url,
+                                        excel_name='data/深圳市.xlsx' if to_excel else None)
+
+    # 对重试后仍失败的附件再下载一次，失败的页面记录在 data/dead_letters.jsonl 中
+    dead_letters = get_dead_letters()
+    dead_letters.retry({'download': lambda record: download_file(record['url'], record['filename'])})
+    dead_letters.report()
+    print('*************** Program Finished *****************')
@@ -0,0 +1,78 @@
+from common.profile import SiteProfile
+
+# 深圳市各栏目的 profile，由 common.engine.ProfileCrawler 执行
+
+# 信息公开格式的基本信息，数字为详情页 xx_con 中第几个 p
+XXGK_COLUMNS = [('索引号', 1), ('省份', '广东省'), ('城市', '深圳市'), ('文件类型', 2), ('文号', 6), ('发布机构', 3),
+                ('发布日期', 4), ('标题', 5), ('主题词', 7)]
+
+# 列表页底部的分页脚本，如 '<script>createPageHTML(50, 0, "index","htm",849);</script>'
+CREATE_PAGE_HTML = ('createPageHTML(', ');', ',')
+
+
+def bulletin_issue_url(target_url, link, title):
+    """
+    往期公报的 url：2019 年的期数相对于 2019 目录，其他年份相对于公报根目录
+    :param target_url: like 'http://www.sz.gov.cn/zfgb/2019/gb1099_181240/'
+    :param link: option value, like './gb1098_181239/'
+    :param title: option text, like '2019年第23期'
+    :return: url
+    """
+    if title.split('年')[0] == '2019':
+        return target_url.split('2019')[0] + '2019/' + link.split('./')[-1]
+    return target_url.split('2019')[0] + link.split('./')[-1]
+
+
+# 政策解读：链接在列表页的 script 中，如 "var _url = './201907/t20190708_18040234.htm';"
+POLICY = SiteProfile(
+    name='政策解读',
+    pagination=CREATE_PAGE_HTML,
+    link_xpath='//div[@class="zx_ml_list"]/ul/li/div/script/text()',
+    link_regex=r"var _url = '(.*?)';",
+    columns=XXGK_COLUMNS,
+)
+
+# 政府文件：链接形如 '../../../zfwj/zfwjnew/szfwj_139223/201907/t20190708_1.htm'
+PUBLIC = SiteProfile(
+    name='政府文件',
+    pagination=CREATE_PAGE_HTML,
+    link_xpath='//div[@class="zx_ml_list"]/ul/li/div/a/@href',
+    link_prefix='http://www.sz.gov.cn',
+    columns=XXGK_COLUMNS,
+)
+
+# 政府公报：往期公报在下拉框中，通知链接在 script 中，如 'opath.push("./content/post_1.html");'
+BULLETIN = SiteProfile(
+    name='政府公报',
+    group_xpath='//select[@name="select3"]/option[@value]',
+    group_url=bulletin_issue_url,
+    link_xpath='//div[@class="zx_zwgb_left"]//script/text()',
+    link_regex=r'opath\.push\("(.*?)"\)',
+    columns=[('期数', '$group')] + XXGK_COLUMNS,
+    subdir='{文件类型}',
+)
+
+# 政府工作报告：各年份的报告标题相同，以发布年份区分，如 '2019政府工作报告'
+REPORT = SiteProfile(
+    name='政府工作报告',
+    link_xpath='//*[@id="top_bg"]/div/div[4]/div[7]/ul/li/a/@href',
+    columns=XXGK_COLUMNS,
+    docx_title='{发布日期:.4}{标题}',
+)
+
+# 新闻发布：标题取自列表页
+NEWS = SiteProfile(
+    name='新闻发布',
+    pagination=CREATE_PAGE_HTML,
+    link_xpath='//div[@class="zx_ml_list"]/ul/li/span[@class="tit"]/a/@href',
+    title_xpath='//div[@class="zx_ml_list"]/ul/li/span[@class="tit"]/a//text()',
+    detail='trs',
+    columns=[('标题', '$title'), ('链接', '$url')],
+)
+
+# 政务动态
+WORK = NEWS.replace(
+    name='政务动态',
+    link_xpath='//div[@class="zx_ml_list"]/ul/li/span/a/@href',
+    title_xpath='//div[@class="zx_ml_list"]/ul/li/span/a//text()',
+)
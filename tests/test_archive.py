@@ -0,0 +1,33 @@
+import os
+import tarfile
+
+from benchmark.mock_site import TARGETS, build_mock_site
+from benchmark.stub_server import StubServer
+from common.session import configure_session
+from common.writers import configure_writer, get_archive
+from shenzhen.craw_shenzhen_news import CrawShenZhenNews
+
+
+def test_notices_are_archived(tmp_path):
+    save_dir = str(tmp_path / 'news')
+    configure_writer(archive_dir=str(tmp_path / 'archive'))
+    try:
+        with StubServer(build_mock_site(page_num=1, items_per_page=3, issue_num=1)) as server:
+            configure_session(proxies={'http': server.url})
+            os.makedirs(save_dir)
+            CrawShenZhenNews().run(save_dir, TARGETS['news'])
+        names = get_archive().names(save_dir)
+        assert len(names) == 3
+        assert get_archive().get(names[0])[:2] == b'PK'
+        # run 结束时关闭分片，写入 tar 的结束块
+        shards = [name for name in os.listdir(str(tmp_path / 'archive')) if name.endswith('.tar')]
+        members = []
+        for shard in shards:
+            # 关闭后的 tar 补齐到 RECORDSIZE 的整数倍
+            assert os.path.getsize(str(tmp_path / 'archive' / shard)) % tarfile.RECORDSIZE == 0
+            with tarfile.open(str(tmp_path / 'archive' / shard)) as tar:
+                members.extend(tar.getnames())
+        assert sorted(members) == names
+        assert os.listdir(save_dir) == []
+    finally:
+        configure_writer(archive_dir=None)
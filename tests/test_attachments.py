@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+
+from benchmark.mock_site import TARGETS, build_mock_site
+from benchmark.stub_server import StubServer
+from common import attachments
+from common.attachments import AttachmentQueue
+from common.frontier import Frontier, WRITTEN
+from common.retry import configure_retry
+from common.seen_index import configure_seen_index, get_seen_index
+from common.session import configure_session
+from shenzhen.craw_shenzhen_gov_files import CrawShenZhenGov
+
+
+class RecordingPages(dict):
+    """
+    记录桩服务器请求过的 url
+    """
+
+    def __init__(self, pages):
+        super().__init__(pages)
+        self.fetched = []
+
+    def get(self, url, default=None):
+        self.fetched.append(url)
+        return super().get(url, default)
+
+
+def build_site(attachment_suffix):
+    """
+    “政策解读”栏目，附件后缀替换为 attachment_suffix
+    """
+    pages = {}
+    for url, body in build_mock_site(page_num=1, items_per_page=3, issue_num=1).items():
+        if url.startswith(TARGETS['policy'].rsplit('/', 1)[0]):
+            if isinstance(body, str):
+                body = body.replace('.pdf', '.' + attachment_suffix)
+            pages[url.replace('.pdf', '.' + attachment_suffix)] = body
+    return RecordingPages(pages)
+
+
+def run_resumable(pages, tmp_path):
+    with StubServer(pages) as server:
+        configure_session(proxies={'http': server.url})
+        frontier = Frontier(str(tmp_path / 'frontier.db'))
+        CrawShenZhenGov().run_resumable(str(tmp_path / 'gov'), TARGETS['policy'], frontier)
+        states = dict(frontier.conn.execute('SELECT url, state FROM frontier'))
+        frontier.close()
+    return states
+
+
+def info_urls(pages):
+    return [url for url in pages.fetched if '/t2019' in url and url.endswith('.htm')]
+
+
+def setup(tmp_path):
+    os.makedirs(str(tmp_path / 'gov'))
+    configure_retry(attempts=1, base_delay=0)
+    configure_seen_index(db_path=str(tmp_path / 'seen.db'))
+
+
+def teardown_function():
+    configure_retry(attempts=4, base_delay=0.5)
+    configure_seen_index(db_path=None)
+
+
+def test_skipped_attachment_is_written(tmp_path):
+    setup(tmp_path)
+    # mp4 附件按 download_options 跳过，通知照常标记为 WRITTEN
+    pages = build_site('mp4')
+    states = run_resumable(pages, tmp_path)
+    assert len(info_urls(pages)) == 3
+    assert set(states.values()) == {WRITTEN}
+    assert all(get_seen_index().seen_url(url) for url in info_urls(pages))
+    pages.fetched = []
+    run_resumable(pages, tmp_path)
+    assert info_urls(pages) == []
+
+
+def test_failed_attachment_is_crawled_again(tmp_path):
+    setup(tmp_path)
+    # 附件一直返回 503，重试次数用完后附件与通知保持未完成
+    pages = build_site('pdf')
+    broken = RecordingPages({url: 503 if url.endswith('.pdf') else body for url, body in pages.items()})
+    states = run_resumable(broken, tmp_path)
+    assert len(info_urls(broken)) == 3
+    assert all(states[url] != WRITTEN for url in info_urls(broken))
+    assert not any(get_seen_index().seen_url(url) for url in info_urls(broken))
+    # 附件恢复后重新爬取并写入
+    states = run_resumable(pages, tmp_path)
+    assert len(info_urls(pages)) == 3
+    assert set(states.values()) == {WRITTEN}
+
+
+def test_concurrent_first_submits(monkeypatch):
+    # 放慢线程池的创建，让多个线程同时进入第一次提交
+    class SlowExecutor(attachments.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            time.sleep(0.05)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(attachments, 'ThreadPoolExecutor', SlowExecutor)
+    queue = AttachmentQueue(workers=4)
+    barrier = threading.Barrier(8)
+
+    def submit():
+        barrier.wait()
+        queue.submit(lambda: True, 'http://www.sz.gov.cn/attachment.pdf')
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.join()
+    assert queue.pending == 0
+    assert queue.report() == {'downloaded': 8, 'skipped': 0, 'failed': 0}
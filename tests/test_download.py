@@ -0,0 +1,21 @@
+import os
+
+from benchmark.stub_server import StubServer
+from common.session import configure_session
+from common.tools import configure_download, download_file
+
+
+def test_too_large_file_removes_part(tmp_path):
+    filename = str(tmp_path / 'attachment.pdf')
+    # 之前中断的下载留下的 .part
+    with open(filename + '.part', mode='wb') as fp:
+        fp.write(b'x' * 100)
+    configure_download(max_size=1000)
+    try:
+        with StubServer({'http://www.sz.gov.cn/attachment.pdf': b'x' * 2000}) as server:
+            configure_session(proxies={'http': server.url})
+            assert download_file('http://www.sz.gov.cn/attachment.pdf', filename) is False
+    finally:
+        configure_download(max_size=None)
+    assert os.path.exists(filename + '.part') is False
+    assert os.path.exists(filename) is False
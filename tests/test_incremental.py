@@ -0,0 +1,72 @@
+import csv
+import os
+
+import pandas as pd
+
+from benchmark.mock_site import TARGETS, build_mock_site
+from benchmark.stub_server import StubServer
+from common.fingerprint import FingerprintStore
+from common.seen_index import configure_seen_index
+from common.session import configure_session
+from shenzhen.craw_shenzhen_news import CrawShenZhenNews
+from shenzhen.profiles import NEWS
+
+SECTIONS = {
+    '新闻发布稿': TARGETS['news'],
+    '采访通知': TARGETS['news'].replace('/xwtg/', '/cftz/'),
+}
+
+
+def build_site():
+    """
+    “新闻发布”的两个子栏目，共用 NEWS 配置
+    """
+    pages = {}
+    for url, body in build_mock_site(page_num=1, items_per_page=3, issue_num=1).items():
+        if url.startswith(TARGETS['news'].rsplit('/', 1)[0]):
+            pages[url] = body
+            pages[url.replace('/xwtg/', '/cftz/')] = body.replace('/xwtg/', '/cftz/') if isinstance(body, str) else body
+    return pages
+
+
+def read_urls(csv_file):
+    """
+    :return: 链接 column of the csv
+    """
+    with open(csv_file, encoding='utf-8') as fp:
+        return [row[1] for row in list(csv.reader(fp))[1:]]
+
+
+def test_rows_are_kept_per_section(tmp_path):
+    store = FingerprintStore(str(tmp_path / 'fingerprint.db'))
+    with StubServer(build_site()) as server:
+        configure_session(proxies={'http': server.url})
+        # 第二次运行所有通知都未变化，csv 仍只包含本栏目的通知
+        for run in range(2):
+            for name, target_url in SECTIONS.items():
+                save_dir = str(tmp_path / name)
+                os.makedirs(save_dir, exist_ok=True)
+                CrawShenZhenNews().run(save_dir, target_url, store=store)
+            assert store.stats['unchanged'] == (3 if run else 0)
+            for name, target_url in SECTIONS.items():
+                urls = read_urls(str(tmp_path / name) + '.csv')
+                assert len(urls) == 3
+                assert all(url.startswith(target_url.rsplit('/', 1)[0]) for url in urls)
+    store.close()
+
+
+def test_seen_index_keeps_earlier_rows(tmp_path):
+    configure_seen_index(db_path=str(tmp_path / 'seen.db'))
+    save_dir = str(tmp_path / '新闻发布稿')
+    os.makedirs(save_dir)
+    excel_name = str(tmp_path / '深圳市.xlsx')
+    try:
+        # 第二次运行跳过已爬取的 3 条通知，只写入新增的 1 条，csv 与 Excel 保留之前的基本信息
+        for items in (3, 4):
+            with StubServer(build_mock_site(page_num=1, items_per_page=items, issue_num=1)) as server:
+                configure_session(proxies={'http': server.url})
+                CrawShenZhenNews().run(save_dir, TARGETS['news'], excel_name=excel_name)
+            assert len(read_urls(save_dir + '.csv')) == items
+            assert len(pd.read_excel(excel_name, sheet_name=NEWS.name)) == items
+    finally:
+        configure_seen_index(db_path=None)
@@ -0,0 +1,37 @@
+import json
+import os
+
+from benchmark.mock_site import TARGETS, build_mock_site
+from benchmark.stub_server import StubServer
+from common.metrics import Metrics
+from common.session import configure_session
+from shenzhen.craw_shenzhen_news import CrawShenZhenNews
+
+
+def load_counts(save_dir):
+    with open(save_dir + '.metrics.json', encoding='utf-8') as fp:
+        return {name: histogram['count'] for name, histogram in json.load(fp)['histograms'].items()}
+
+
+def test_merge_snapshot():
+    first, second = Metrics(), Metrics()
+    first.observe('get_html_bytes', 0.02)
+    second.observe('get_html_bytes', 0.5)
+    second.inc('dead_letters')
+    first.merge(second.snapshot())
+    summary = first.summary()
+    assert summary['counters'] == {'dead_letters': 1}
+    assert summary['histograms']['get_html_bytes']['count'] == 2
+    assert summary['histograms']['get_html_bytes']['max'] == 0.5
+
+
+def test_metrics_of_each_run(tmp_path):
+    with StubServer(build_mock_site(page_num=1, items_per_page=3, issue_num=1)) as server:
+        configure_session(proxies={'http': server.url})
+        # 同一进程中依次运行，每个栏目的 metrics.json 只包含本次运行
+        for name, run in (('run', CrawShenZhenNews().run), ('run_async', CrawShenZhenNews().run_async),
+                          ('run_pipeline', CrawShenZhenNews().run_pipeline)):
+            save_dir = str(tmp_path / name)
+            os.makedirs(save_dir)
+            run(save_dir, TARGETS['news'])
+            assert load_counts(save_dir)['write_word_file'] == 3
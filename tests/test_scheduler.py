@@ -0,0 +1,38 @@
+import os
+
+from common.scheduler import WorkStealingScheduler
+
+
+def square(x):
+    return x * x
+
+
+def square_or_die(x):
+    # 模拟子进程被杀死（如内存不足）
+    if x == 3:
+        os._exit(1)
+    return x * x
+
+
+def broken_initializer():
+    raise RuntimeError('initializer failed')
+
+
+def test_results_in_order():
+    scheduler = WorkStealingScheduler(3)
+    assert scheduler.run(square, range(20)) == [x * x for x in range(20)]
+    assert sum(stats['tasks'] for stats in scheduler.utilization()) == 20
+
+
+def test_initializer_error_does_not_hang():
+    scheduler = WorkStealingScheduler(2, initializer=broken_initializer)
+    assert scheduler.run(square, range(6)) == [None] * 6
+    assert all(stats['error'] for stats in scheduler.stats)
+
+
+def test_killed_worker_does_not_hang():
+    scheduler = WorkStealingScheduler(2)
+    results = scheduler.run(square_or_die, range(8))
+    assert results[3] is None
+    assert [stats['worker'] for stats in scheduler.stats] == [0, 1]
+    assert any(stats['error'] for stats in scheduler.stats)
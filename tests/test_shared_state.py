@@ -0,0 +1,64 @@
+import multiprocessing
+
+import pytest
+
+from common import retry, throttle
+from common.retry import configure_retry
+from common.scheduler import WorkStealingScheduler
+from common.seen_index import configure_seen_index, get_seen_index
+from common.shared_state import get_shared_state, set_shared_state
+from common.throttle import configure_throttle
+
+
+@pytest.fixture
+def spawn():
+    # spawn 启动的子进程不继承模块的全局变量，共用的状态只能通过 initargs 传入
+    method = multiprocessing.get_start_method()
+    multiprocessing.set_start_method('spawn', force=True)
+    yield
+    multiprocessing.set_start_method(method, force=True)
+
+
+def take_budget(n):
+    return sum(retry._take_budget() for _ in range(n))
+
+
+def acquire_slot(n):
+    throttle.get_controller().acquire()
+    return throttle.get_controller().in_flight
+
+
+def check_seen(url):
+    index = get_seen_index()
+    seen = index.seen_url(url)
+    index.add(url + '/child')
+    return seen
+
+
+def test_retry_budget_is_shared_by_scheduler(spawn):
+    configure_retry(budget=5)
+    try:
+        assert sum(WorkStealingScheduler(2).run(take_budget, [4, 4, 4])) == 5
+    finally:
+        configure_retry(budget=None)
+
+
+def test_controller_is_shared_by_pool(spawn):
+    configure_throttle(adaptive=True, initial_limit=8)
+    try:
+        with multiprocessing.Pool(2, initializer=set_shared_state, initargs=(get_shared_state(),)) as pool:
+            pool.map(acquire_slot, range(3))
+        assert throttle.get_controller().in_flight == 3
+    finally:
+        configure_throttle(adaptive=False)
+
+
+def test_seen_index_is_shared_by_scheduler(spawn, tmp_path):
+    configure_seen_index(db_path=str(tmp_path / 'seen.db'))
+    try:
+        get_seen_index().add('http://www.sz.gov.cn/a.htm')
+        results = WorkStealingScheduler(2).run(check_seen, ['http://www.sz.gov.cn/a.htm', 'http://www.sz.gov.cn/b.htm'])
+        assert results == [True, False]
+        assert 'http://www.sz.gov.cn/b.htm/child' in get_seen_index()
+    finally:
+        configure_seen_index(db_path=None)